@@ -0,0 +1,181 @@
+# bench/fake_services.py
+"""
+Локальные заглушки GitHub API, Mistral chat API и Telegram Bot API для нагрузочных тестов.
+
+Все три сервиса обслуживаются одним приложением на разных путях, поэтому бот
+направляется сюда переменными GITHUB_API_BASE, MISTRAL_SERVER_URL и TELEGRAM_API_BASE.
+
+    python -m bench.fake_services --port 9100 --llm-latency 0.5 --llm-tps 80
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class FakeConfig:
+    """Поведение заглушек: задержки, размеры и скорость генерации."""
+    github_latency: float = 0.05
+    files_per_push: int = 10
+    file_lines: int = 200
+    llm_latency: float = 0.5
+    llm_tps: float = 80.0
+    llm_tokens: int = 300
+    telegram_latency: float = 0.03
+    stats: Dict[str, int] = field(default_factory=dict)
+
+    def count(self, name: str) -> None:
+        self.stats[name] = self.stats.get(name, 0) + 1
+
+
+def push_paths(count: int):
+    """Пути файлов, которые «меняет» каждый push (тот же список использует генератор нагрузки)."""
+    return [f"pkg/mod_{i}.py" for i in range(count)]
+
+
+def _blob_sha(commit_sha: str, path: str) -> str:
+    return hashlib.sha1(f"{commit_sha}:{path}".encode()).hexdigest()
+
+
+def _blob_text(blob_sha: str, lines: int) -> str:
+    """Детерминированный «исходник» заданной длины."""
+    body = []
+    for i in range(lines):
+        if i % 20 == 0:
+            body.append(f"def func_{blob_sha[:6]}_{i}(value):")
+        else:
+            body.append(f"    value = value + {i}  # {blob_sha[i % 40]}")
+    return "\n".join(body) + "\n"
+
+
+def _patch(lines: int) -> str:
+    hunk = [f"@@ -{lines // 2},7 +{lines // 2},7 @@ def func():", "     a = 1", "     b = 2", "     c = 3",
+            "-    d = 4", "+    d = 5", "     e = 6", "     f = 7", "     g = 8"]
+    return "\n".join(hunk)
+
+
+def create_app(config: FakeConfig) -> FastAPI:
+    app = FastAPI(title="Fake GitHub/Mistral/Telegram")
+
+    # --- GitHub -----------------------------------------------------------------
+
+    @app.get("/repos/{owner}/{repo}/git/trees/{sha}")
+    async def git_tree(owner: str, repo: str, sha: str):
+        config.count("github_tree")
+        await asyncio.sleep(config.github_latency)
+        tree = [{"path": path, "type": "blob", "sha": _blob_sha(sha, path)}
+                for path in push_paths(config.files_per_push)]
+        return {"sha": sha, "tree": tree, "truncated": False}
+
+    @app.get("/repos/{owner}/{repo}/git/blobs/{blob_sha}")
+    async def git_blob(owner: str, repo: str, blob_sha: str, request: Request):
+        config.count("github_blob")
+        await asyncio.sleep(config.github_latency)
+        text = _blob_text(blob_sha, config.file_lines)
+        if "raw" in request.headers.get("accept", ""):
+            return Response(text.encode(), media_type="application/octet-stream")
+        return {"sha": blob_sha, "encoding": "base64", "content": base64.b64encode(text.encode()).decode()}
+
+    @app.get("/repos/{owner}/{repo}/contents/{path:path}")
+    async def contents(owner: str, repo: str, path: str, ref: str = ""):
+        config.count("github_contents")
+        await asyncio.sleep(config.github_latency)
+        text = _blob_text(_blob_sha(ref, path), config.file_lines)
+        return {"path": path, "encoding": "base64", "content": base64.b64encode(text.encode()).decode()}
+
+    @app.get("/repos/{owner}/{repo}/compare/{basehead}")
+    async def compare(owner: str, repo: str, basehead: str):
+        config.count("github_compare")
+        await asyncio.sleep(config.github_latency)
+        after = basehead.split("...", 1)[-1]
+        files = [{"filename": path, "status": "modified", "sha": _blob_sha(after, path),
+                  "patch": _patch(config.file_lines)}
+                 for path in push_paths(config.files_per_push)]
+        return {"status": "ahead", "files": files}
+
+    # --- Mistral ----------------------------------------------------------------
+
+    def _completion_text(tokens: int) -> str:
+        return " ".join(f"замечание{i % 17}" for i in range(tokens))
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        config.count("mistral")
+        body = await request.json()
+        prompt_chars = sum(len(m.get("content") or "") for m in body.get("messages", []))
+        usage = {"prompt_tokens": prompt_chars // 3, "completion_tokens": config.llm_tokens,
+                 "total_tokens": prompt_chars // 3 + config.llm_tokens}
+        base = {"id": f"fake-{time.time_ns()}", "model": body.get("model", "fake"), "created": int(time.time())}
+
+        await asyncio.sleep(config.llm_latency)
+        if not body.get("stream"):
+            await asyncio.sleep(config.llm_tokens / config.llm_tps)
+            return {**base, "object": "chat.completion", "usage": usage,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": _completion_text(config.llm_tokens)}}]}
+
+        async def events():
+            words = _completion_text(config.llm_tokens).split(" ")
+            for i, word in enumerate(words):
+                await asyncio.sleep(1 / config.llm_tps)
+                chunk = {**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+                if i == len(words) - 1:
+                    chunk["choices"][0]["finish_reason"] = "stop"
+                    chunk["usage"] = usage
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    # --- Telegram ---------------------------------------------------------------
+
+    @app.post("/bot{token}/{method}")
+    async def telegram(token: str, method: str):
+        config.count(f"telegram_{method}")
+        await asyncio.sleep(config.telegram_latency)
+        return JSONResponse({"ok": True, "result": {"message_id": config.stats[f"telegram_{method}"]}})
+
+    # --- Служебное --------------------------------------------------------------
+
+    @app.get("/_stats")
+    async def stats():
+        return config.stats
+
+    return app
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Заглушки GitHub/Mistral/Telegram для бенчмарка")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--github-latency", type=float, default=0.05, help="задержка ответа GitHub, с")
+    parser.add_argument("--files-per-push", type=int, default=10)
+    parser.add_argument("--file-lines", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="задержка до первого токена, с")
+    parser.add_argument("--llm-tps", type=float, default=80.0, help="скорость генерации, токенов/с")
+    parser.add_argument("--llm-tokens", type=int, default=300, help="длина ответа, токенов")
+    parser.add_argument("--telegram-latency", type=float, default=0.03)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    config = FakeConfig(github_latency=args.github_latency, files_per_push=args.files_per_push,
+                        file_lines=args.file_lines, llm_latency=args.llm_latency, llm_tps=args.llm_tps,
+                        llm_tokens=args.llm_tokens, telegram_latency=args.telegram_latency)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
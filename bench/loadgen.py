@@ -0,0 +1,246 @@
+# bench/loadgen.py
+"""
+Нагрузочный тест бота на локальных заглушках: без GitHub, Mistral и Telegram.
+
+Поднимает bench.fake_services и бота (uvicorn src.main:app) отдельными процессами,
+подаёт подписанные push-события на root_webhook с заданной частотой и выводит
+p50/p99 ответа webhook и полного ревью, пропускную способность и ресурсы процесса бота.
+
+    python -m bench.loadgen --rate 5 --duration 30 --files-per-push 20 --llm-tps 60
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from bench.fake_services import push_paths
+
+ROOT = Path(__file__).resolve().parent.parent
+SECRET = "bench-secret"
+REPO_ID = 424242
+CHAT_ID = 1001
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def _push_payload(n: int, files_per_push: int) -> bytes:
+    """Push с уникальными before/after, чтобы кэш ревью не подменял работу."""
+    before = hashlib.sha1(f"before-{n}-{uuid.uuid4()}".encode()).hexdigest()
+    after = hashlib.sha1(f"after-{n}-{uuid.uuid4()}".encode()).hexdigest()
+    event = {
+        "ref": f"refs/heads/bench-{n}",
+        "before": before,
+        "after": after,
+        "repository": {"id": REPO_ID, "full_name": "bench/repo"},
+        "commits": [{"added": [], "modified": push_paths(files_per_push), "removed": []}],
+    }
+    return json.dumps(event).encode()
+
+
+def _sign(body: bytes) -> str:
+    return "sha256=" + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+def _proc_usage(pid: int) -> Dict[str, float]:
+    """CPU-время и пиковая память процесса бота из /proc (только Linux)."""
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        status = Path(f"/proc/{pid}/status").read_text()
+        hwm = next(line for line in status.splitlines() if line.startswith("VmHWM:"))
+        return {"cpu_seconds": (int(stat[11]) + int(stat[12])) / ticks,
+                "max_rss_mb": int(hwm.split()[1]) / 1024}
+    except (OSError, StopIteration, IndexError, ValueError):
+        return {}
+
+
+async def _wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Сервис не поднялся: {url}")
+
+
+async def _one_push(client: httpx.AsyncClient, bot_url: str, n: int, args: argparse.Namespace,
+                    results: Dict[str, list]) -> None:
+    body = _push_payload(n, args.files_per_push)
+    headers = {"X-Hub-Signature-256": _sign(body), "X-GitHub-Event": "push",
+               "X-GitHub-Delivery": str(uuid.uuid4()), "Content-Type": "application/json"}
+    sent_at = time.time()
+    try:
+        resp = await client.post(bot_url + "/", content=body, headers=headers)
+    except httpx.HTTPError as e:
+        results["errors"].append(f"webhook: {e}")
+        return
+    results["ack"].append(time.time() - sent_at)
+    if resp.status_code != 202:
+        results["errors"].append(f"webhook: HTTP {resp.status_code}")
+        return
+
+    job_id = resp.json()["job_id"]
+    deadline = time.monotonic() + args.job_timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(args.poll_interval)
+        job = (await client.get(f"{bot_url}/jobs/{job_id}")).json()
+        if job.get("status") == "done":
+            results["e2e"].append(job["finished_at"] - sent_at)
+            return
+        if job.get("status") == "failed":
+            results["errors"].append(f"job: {job.get('error')}")
+            return
+    results["errors"].append("job: timeout")
+
+
+async def _generate_load(bot_url: str, args: argparse.Namespace) -> Dict[str, list]:
+    results: Dict[str, list] = {"ack": [], "e2e": [], "errors": []}
+    total = int(args.rate * args.duration)
+    start = time.monotonic()
+    async with httpx.AsyncClient(timeout=args.job_timeout) as client:
+        tasks = []
+        for n in range(total):
+            # Открытая модель нагрузки: отправляем по расписанию, не дожидаясь предыдущих
+            await asyncio.sleep(max(0.0, start + n / args.rate - time.monotonic()))
+            tasks.append(asyncio.create_task(_one_push(client, bot_url, n, args, results)))
+        await asyncio.gather(*tasks)
+    results["elapsed"] = [time.monotonic() - start]
+    return results
+
+
+def _bot_env(args: argparse.Namespace, fake_url: str, workdir: Path) -> Dict[str, str]:
+    mappings = workdir / "mappings.json"
+    mappings.write_text(json.dumps({f"id_{REPO_ID}": {"repo_id": REPO_ID, "chat_id": CHAT_ID,
+                                                      "review_mode": args.mode}}))
+    return {
+        **os.environ,
+        "GITHUB_WEBHOOK_SECRET": SECRET,
+        "GITHUB_TOKEN": "bench",
+        "MISTRAL_API_KEY": "bench",
+        "TELEGRAM_BOT_TOKEN": "bench",
+        "GITHUB_API_BASE": fake_url,
+        "MISTRAL_SERVER_URL": fake_url,
+        "TELEGRAM_API_BASE": fake_url,
+        "REPO_MAP_FILE": str(mappings),
+        # Всё состояние бота — во временном каталоге: иначе при старте он возобновит настоящие задачи
+        "REVIEW_CACHE_PATH": str(workdir / "review_cache.sqlite3"),
+        "JOB_STORE_PATH": str(workdir / "jobs.sqlite3"),
+        "REVIEW_HISTORY_PATH": str(workdir / "review_history.sqlite3"),
+        "REPO_MIRROR_DIR": str(workdir / "mirrors"),
+        "REPO_MIRROR_ENABLED": "0",
+        "REVIEW_WORKERS": str(args.workers),
+        "PUSH_DEBOUNCE_SECONDS": "0",
+    }
+
+
+def _report(results: Dict[str, list], usage: Dict[str, float], fake_stats: Dict[str, int]) -> Dict:
+    elapsed = results["elapsed"][0]
+    return {
+        "pushes_sent": len(results["ack"]) + sum(1 for e in results["errors"] if e.startswith("webhook")),
+        "reviews_done": len(results["e2e"]),
+        "errors": len(results["errors"]),
+        "error_samples": results["errors"][:5],
+        "throughput_reviews_per_s": round(len(results["e2e"]) / elapsed, 3) if elapsed else 0,
+        "ack_p50_ms": _ms(_percentile(results["ack"], 50)),
+        "ack_p99_ms": _ms(_percentile(results["ack"], 99)),
+        "e2e_p50_s": _round(_percentile(results["e2e"], 50)),
+        "e2e_p99_s": _round(_percentile(results["e2e"], 99)),
+        "bot": usage,
+        "upstream_calls": fake_stats,
+    }
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return round(value * 1000, 1) if value is not None else None
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 3) if value is not None else None
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота на локальных заглушках")
+    parser.add_argument("--rate", type=float, default=2.0, help="push'ей в секунду")
+    parser.add_argument("--duration", type=float, default=20.0, help="длительность подачи нагрузки, с")
+    parser.add_argument("--files-per-push", type=int, default=10)
+    parser.add_argument("--file-lines", type=int, default=200)
+    parser.add_argument("--mode", choices=("diff", "full"), default="diff")
+    parser.add_argument("--workers", type=int, default=4, help="REVIEW_WORKERS бота")
+    parser.add_argument("--github-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-tps", type=float, default=80.0)
+    parser.add_argument("--llm-tokens", type=int, default=300)
+    parser.add_argument("--telegram-latency", type=float, default=0.03)
+    parser.add_argument("--bot-port", type=int, default=9200)
+    parser.add_argument("--fake-port", type=int, default=9100)
+    parser.add_argument("--job-timeout", type=float, default=300.0)
+    parser.add_argument("--poll-interval", type=float, default=0.1)
+    parser.add_argument("--json", action="store_true", help="вывести отчёт одной JSON-строкой")
+    return parser.parse_args(argv)
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    bot_url = f"http://127.0.0.1:{args.bot_port}"
+    fake_cmd = [sys.executable, "-m", "bench.fake_services", "--port", str(args.fake_port),
+                "--github-latency", str(args.github_latency), "--files-per-push", str(args.files_per_push),
+                "--file-lines", str(args.file_lines), "--llm-latency", str(args.llm_latency),
+                "--llm-tps", str(args.llm_tps), "--llm-tokens", str(args.llm_tokens),
+                "--telegram-latency", str(args.telegram_latency)]
+
+    with tempfile.TemporaryDirectory(prefix="review-bench-") as tmp:
+        workdir = Path(tmp)
+        bot_cmd = [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(args.bot_port),
+                   "--log-level", "warning"]
+        fake = subprocess.Popen(fake_cmd, cwd=ROOT)
+        bot = subprocess.Popen(bot_cmd, cwd=workdir, env={**_bot_env(args, fake_url, workdir),
+                                                          "PYTHONPATH": str(ROOT)},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            await _wait_ready(fake_url + "/_stats")
+            await _wait_ready(bot_url + "/metrics")
+            results = await _generate_load(bot_url, args)
+            usage = _proc_usage(bot.pid)
+            async with httpx.AsyncClient() as client:
+                fake_stats = (await client.get(fake_url + "/_stats")).json()
+        finally:
+            for proc in (bot, fake):
+                proc.terminate()
+                proc.wait(timeout=10)
+    return _report(results, usage, fake_stats)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+        return
+    for key, value in report.items():
+        print(f"{key:>26}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,56 +3,110 @@
 from dotenv import load_dotenv
 import os
 
-load_dotenv() 
+load_dotenv()
 
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from src.utils.github_webhook import handle_github_webhook
-from src.utils.mistral_client import get_long_completion
-from utils.chat_notifier import notify_telegram_review, send_code_review
-from src.utils.repo_chat_map import is_repo_id_registered, get_chat_id
+from src.utils import http_clients, static_analysis
+from src.utils.repo_chat_map import is_repo_id_registered
+from src.utils.metrics import WEBHOOKS, register_gauge, render, track
+from src.utils.review_cache import cache_stats
+from src.utils.llm_scheduler import limiter as llm_limiter
+from src.utils.review_pipeline import run_review
+from src.utils.review_queue import ReviewQueue, QueueFullError
+from src.utils.webhook_dedup import DeliveryDeduplicator, PushCoalescer
 from loguru import logger
 
-logger.add("webhook_debug.log", rotation="10 MB")  
-app = FastAPI(title="AI Code Reviewer Bot")
+logger.add("webhook_debug.log", rotation="10 MB")
 
 GITHUB_WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET").encode("utf-8")
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+
+review_queue = ReviewQueue(run_review)
+deliveries = DeliveryDeduplicator()
+push_coalescer = PushCoalescer(review_queue)
+
+register_gauge("review_queue_depth", "Задачи, ожидающие воркера", lambda: review_queue.depth)
+register_gauge("review_pushes_debouncing", "Push'и в окне склейки", lambda: push_coalescer.pending_count)
+register_gauge("review_cache_hit_ratio", "Доля попаданий в кэш ревью", lambda: cache_stats()["hit_ratio"])
+register_gauge("mistral_concurrency_limit", "Текущий лимит параллельных запросов к Mistral", lambda: llm_limiter.limit)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await http_clients.startup()
+    await review_queue.start()
+    yield
+    push_coalescer.flush_all()
+    await review_queue.stop()
+    static_analysis.shutdown()
+    await http_clients.shutdown()
+
+
+app = FastAPI(title="AI Code Reviewer Bot", lifespan=lifespan)
 
 
 @app.post("/")
 async def root_webhook(request: Request):
+    with track("webhook"):
+        response = await _accept_webhook(request)
+    WEBHOOKS.inc(result=response.get("status") if isinstance(response, dict) else f"http_{response.status_code}")
+    return response
+
+
+async def _accept_webhook(request: Request):
     try:
-        data_result = await handle_github_webhook(request, GITHUB_WEBHOOK_SECRET, GITHUB_TOKEN)
-        if data_result.get("status") == "review_queued":
-            repo_id = data_result['repo_id']
-            if is_repo_id_registered(repo_id):
-                logger.success(f"id_repo: {repo_id} нашлось в памяти")
-            else:
-                logger.error(f"❌ Ошибка id_repo в памяти")
-                return {"status": "error", "detail": "Ошибка id_repo в памяти"}
-            chat_id = get_chat_id(repo_id);  
-
-            success = await notify_telegram_review(
-                chat_id,
-                repo_name=data_result['repo'],
-                commit_id=data_result['commit'],
-                files_count=data_result['files']
-            )
-            if success:
-                logger.success("📱 Telegram уведомление отправлено!")
-            
-            code = data_result.get("contents") or "<FAILED TO FETCH FILE CONTENTS>"
-            prompt = f"Проанализируй следующий код:\n\n{code}" 
-            review = await get_long_completion(prompt)
-            
-            # Отправляем результат
-            await send_code_review(review, chat_id)
-
-        return {"status": "ok"}
+        data_result = await handle_github_webhook(request, GITHUB_WEBHOOK_SECRET)
+        if isinstance(data_result, Response):
+            return data_result
+        if data_result.get("status") != "review_queued":
+            return {"status": "ok"}
+
+        delivery_id = data_result.get("delivery_id")
+        if delivery_id and deliveries.is_duplicate(delivery_id):
+            logger.info(f"♻️ Повторная доставка {delivery_id} — пропускаем")
+            return {"status": "duplicate"}
+
+        repo_id = data_result['repo_id']
+        if is_repo_id_registered(repo_id):
+            logger.success(f"id_repo: {repo_id} нашлось в памяти")
+        else:
+            logger.error(f"❌ Ошибка id_repo в памяти")
+            return {"status": "error", "detail": "Ошибка id_repo в памяти"}
+
+        # Само ревью выполняется воркером — GitHub получает ответ сразу
+        job_id = push_coalescer.submit(data_result)
+        if delivery_id:
+            deliveries.remember(delivery_id)
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED,
+                            content={"status": "queued", "job_id": job_id})
+    except QueueFullError as e:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            content={"status": "busy", "detail": str(e)},
+                            headers={"Retry-After": "30"})
     except Exception as e:
         logger.exception("💥 Ошибка в webhook обработчике")
-        return {"status": "error", "detail": str(e)}, 500
+        return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            content={"status": "error", "detail": str(e)})
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = review_queue.get(job_id)
+    if job is None and push_coalescer.is_pending(job_id):
+        return {"job_id": job_id, "status": "debouncing", "queue_depth": review_queue.depth}
+    if job is None:
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND,
+                            content={"status": "error", "detail": "Задача не найдена"})
+    return {**job.to_dict(), "queue_depth": review_queue.depth}
 
 
+@app.get("/cache/stats")
+async def review_cache_stats():
+    return cache_stats()
 
 
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
@@ -1,60 +1,320 @@
 # src/utils/telegram_notifier.py
 
 import aiohttp
+import asyncio
+import html
+import re
+import time
 from loguru import logger
 import os
+from typing import Callable, Dict, List, Optional
+from src.utils.http_clients import telegram_session
+from src.utils.metrics import STAGE_ERRORS, TELEGRAM_MESSAGES, TELEGRAM_RETRIES, track
+from src.utils.rate_limit import TokenBucket
 
 # Загружаем переменные из окружения (на случай, если файл используется отдельно)
 bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
 
-async def send_telegram_message(bot_token: str, chat_id: str, message: str) -> bool:
-    """
-    Асинхронно отправляет сообщение в Telegram бот.
-    
-    Args:
-        bot_token: Токен бота
-        chat_id: ID чата (пользователя/группы/канала)
-        message: Текст сообщения
-    
-    Returns:
-        True если отправлено успешно
-    """
-    # Убираем лишние пробелы в URL!
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    
-    payload = {
-        "chat_id": chat_id,
-        "text": message,
-        "parse_mode": "HTML"  # Поддерживает <b>, <i>, <code>, ссылки
-    }
-    
+# Лимит длины одного сообщения Telegram и минимальный интервал между правками «живого» сообщения
+TELEGRAM_MAX_LENGTH = 4096
+TELEGRAM_EDIT_INTERVAL = float(os.getenv("TELEGRAM_EDIT_INTERVAL", "2.0"))
+
+# Лимиты Bot API (запросов в секунду): на бота в целом, в личный чат и в группу (~20 в минуту)
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_GROUP_RATE = float(os.getenv("TELEGRAM_GROUP_RATE", str(20 / 60)))
+TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+# Повторы при 429 (ждём retry_after), 5xx и сетевых ошибках
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "5"))
+
+_global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE)
+_chat_buckets: Dict[str, TokenBucket] = {}
+
+# Токены HTML для разбиения: теги, сущности, переводы строк и куски текста
+_HTML_TOKEN_RE = re.compile(r"<[^<>]*>|&#?\w+;|\n|[^<&\n]{1,512}|[<&]")
+_TAG_NAME_RE = re.compile(r"</?\s*([a-zA-Z][\w-]*)")
+# Теги, которые понимает parse_mode=HTML; остальное в тексте — не разметка
+_TELEGRAM_TAGS = {"b", "strong", "i", "em", "u", "ins", "s", "strike", "del", "span", "tg-spoiler",
+                  "a", "code", "pre", "blockquote", "tg-emoji"}
+# Разметка markdown в ответах модели, которую переводим в HTML Telegram
+_CODE_BLOCK_RE = re.compile(r"```[\w+#.-]*\n?(.*?)```", re.S)
+_INLINE_CODE_RE = re.compile(r"`([^`\n]+)`")
+_BOLD_RE = re.compile(r"\*\*(\S(?:[^*\n]*\S)?)\*\*")
+_HEADING_RE = re.compile(r"^#{1,6}\s+(.+)$", re.M)
+_ANY_TAG_RE = re.compile(r"<[^<>]*>")
+
+
+def _chat_bucket(chat_id: str) -> TokenBucket:
+    key = str(chat_id)
+    if key not in _chat_buckets:
+        # У групп и каналов отрицательные ID
+        rate = TELEGRAM_GROUP_RATE if key.startswith("-") else TELEGRAM_CHAT_RATE
+        _chat_buckets[key] = TokenBucket(rate, TELEGRAM_CHAT_BURST)
+    return _chat_buckets[key]
+
+
+async def _acquire_slot(chat_id: str, wait: bool) -> bool:
+    """Берёт токен чата и общий токен бота; без wait — только если оба свободны сейчас."""
+    chat = _chat_bucket(chat_id)
+    if not wait:
+        if not (chat.ready() and _global_bucket.ready()):
+            return False
+        chat.take()
+        _global_bucket.take()
+        return True
+    with track("telegram_wait"):
+        await chat.acquire()
+        await _global_bucket.acquire()
+    return True
+
+
+async def _post(url: str, method: str, payload: dict) -> Optional[dict]:
+    """Один HTTP-запрос к Bot API → ответ API или None при сетевой ошибке."""
+    TELEGRAM_MESSAGES.inc(method=method)
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                result = await response.json()
-                
-                if result.get("ok"):
-                    logger.info(f"✅ Сообщение отправлено: {result['result']['message_id']}")
-                    return True
-                else:
-                    logger.error(f"❌ Ошибка Telegram: {result.get('description', 'Unknown error')}")
-                    return False
-                    
-    except aiohttp.ClientError as e:
+        with track("telegram"):
+            async with telegram_session().post(url, json=payload) as response:
+                return await response.json()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         logger.error(f"❌ Network error: {e}")
-        return False
-    except Exception as e:
-        logger.error(f"❌ Unexpected error: {e}")
-        return False
+        return None
+
+
+async def _call_telegram(bot_token: str, method: str, payload: dict, wait: bool = True) -> Optional[dict]:
+    """Вызывает метод Bot API в пределах лимитов; возвращает result или None при ошибке.
+
+    wait=False — не ждать свободного слота и не повторять (промежуточные правки просто пропускаются)."""
+    # Убираем лишние пробелы в URL!
+    url = f"{TELEGRAM_API_BASE}/bot{bot_token}/{method}"
+    chat_id = payload.get("chat_id", "")
+
+    for attempt in range(TELEGRAM_MAX_RETRIES + 1):
+        if not await _acquire_slot(chat_id, wait):
+            return None
+        try:
+            result = await _post(url, method, payload)
+        except Exception as e:
+            logger.error(f"❌ Unexpected error: {e}")
+            return None
+
+        if result is not None and result.get("ok"):
+            return result["result"]
+        if result is not None and "message is not modified" in result.get("description", ""):
+            # Правка тем же текстом (повтор после перезапуска) — сообщение уже в нужном виде
+            return {}
+        if result is not None and result.get("error_code") == 429:
+            # Flood control: весь чат ждёт retry_after, остальные чаты не задерживаются
+            retry_after = (result.get("parameters") or {}).get("retry_after", 1)
+            _chat_bucket(chat_id).pause(retry_after)
+            TELEGRAM_RETRIES.inc(reason="429")
+            logger.warning(f"⏳ Telegram {method}: лимит чата {chat_id}, ждём {retry_after} с")
+            delay = 0
+        elif result is None or result.get("error_code", 0) >= 500:
+            TELEGRAM_RETRIES.inc(reason="error")
+            delay = min(2 ** attempt, 30)
+        else:
+            STAGE_ERRORS.inc(stage="telegram")
+            logger.error(f"❌ Ошибка Telegram ({method}): {result.get('description', 'Unknown error')}")
+            return None
+        if not wait:
+            return None
+        if attempt < TELEGRAM_MAX_RETRIES:
+            await asyncio.sleep(delay)
+
+    STAGE_ERRORS.inc(stage="telegram")
+    logger.error(f"❌ Telegram {method}: не доставлено после {TELEGRAM_MAX_RETRIES + 1} попыток")
+    return None
+
+
+def _emphasis(text: str) -> str:
+    text = _BOLD_RE.sub(r"<b>\1</b>", html.escape(text))
+    return _HEADING_RE.sub(r"<b>\1</b>", text)
+
+
+def _inline_markdown(text: str) -> str:
+    out: List[str] = []
+    pos = 0
+    for match in _INLINE_CODE_RE.finditer(text):
+        out.append(_emphasis(text[pos:match.start()]))
+        out.append(f"<code>{html.escape(match.group(1))}</code>")
+        pos = match.end()
+    out.append(_emphasis(text[pos:]))
+    return "".join(out)
+
+
+def markdown_to_html(text: str) -> str:
+    """Ответ модели → валидный HTML Telegram.
+
+    Весь текст экранируется (List<T>, a < b), размечаются только блоки и строки кода, **жирный** и заголовки."""
+    out: List[str] = []
+    pos = 0
+    for match in _CODE_BLOCK_RE.finditer(text):
+        out.append(_inline_markdown(text[pos:match.start()]))
+        out.append(f"<pre>{html.escape(match.group(1).rstrip(chr(10)))}</pre>")
+        pos = match.end()
+    out.append(_inline_markdown(text[pos:]))
+    return "".join(out)
+
+
+def html_to_plain(text: str) -> str:
+    """HTML → простой текст для отправки без parse_mode (запасной вариант, если HTML не принят)."""
+    return html.unescape(_ANY_TAG_RE.sub("", text))
+
+
+def _close_tags(stack: List[tuple]) -> str:
+    return "".join(f"</{name}>" for name, _ in reversed(stack))
 
 
-async def notify_telegram_review(chat_id: str, repo_name: str, commit_id: str, files_count: int) -> bool:
-    """Уведомление о запуске code review."""
-    
+def _open_tags(stack: List[tuple]) -> str:
+    return "".join(tag for _, tag in stack)
+
+
+def _apply_tag(stack: List[tuple], token: str) -> List[tuple]:
+    """Стек открытых тегов после токена; не-теги и неизвестные Telegram теги его не меняют."""
+    match = _TAG_NAME_RE.match(token)
+    name = match.group(1).lower() if match else ""
+    if name not in _TELEGRAM_TAGS:
+        return stack
+    if token.startswith("</"):
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i][0] == name:
+                return stack[:i]
+        return stack
+    return stack + [(name, token)]
+
+
+def split_html(text: str, limit: int = TELEGRAM_MAX_LENGTH) -> List[str]:
+    """Делит валидный HTML Telegram на части не длиннее limit: по строкам, не разрывая теги и сущности.
+
+    Незакрытые на границе теги закрываются в конце части и открываются заново в следующей;
+    длина каждой части проверяется уже с этими тегами."""
+    parts: List[str] = []
+    current = ""
+    stack: List[tuple] = []
+    # Длина заново открытых тегов в начале current — без текста часть не выделяем
+    opened = 0
+    # Последний перевод строки в current и открытые на нём теги — лучшее место разреза
+    newline: Optional[tuple] = None
+
+    for token in _HTML_TOKEN_RE.findall(text):
+        after = _apply_tag(stack, token)
+        while len(current) + len(token) + len(_close_tags(after)) > limit and len(current) > opened:
+            if newline and newline[0] > opened:
+                cut, open_tags = newline
+                parts.append(current[:cut] + _close_tags(open_tags))
+                current = _open_tags(open_tags) + current[cut:].lstrip("\n")
+                opened = len(_open_tags(open_tags))
+            else:
+                parts.append(current + _close_tags(stack))
+                current = _open_tags(stack)
+                opened = len(current)
+            newline = None
+
+        if token == "\n":
+            newline = (len(current), stack)
+        current += token
+        stack = after
+
+    if len(current) > opened or not parts:
+        parts.append(current)
+    return parts
+
+
+async def _send_part(chat_id: str, part: str) -> bool:
+    """Отдельное сообщение с HTML, при ошибке разметки — простым текстом."""
+    for payload in ({"chat_id": chat_id, "text": part, "parse_mode": "HTML"},
+                    {"chat_id": chat_id, "text": html_to_plain(part)}):
+        if await _call_telegram(bot_token, "sendMessage", payload) is not None:
+            return True
+    return False
+
+
+class LiveMessage:
+    """Сообщение, которое дописывается по мере генерации ревью (через editMessageText)."""
+
+    def __init__(self, chat_id: str, message_id: Optional[int] = None,
+                 on_created: Optional[Callable[[int], None]] = None, header: str = ""):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.header = header
+        self._on_created = on_created
+        self._shown = ""
+        self._last_edit = 0.0
+
+    async def update(self, text: str) -> None:
+        """Показывает промежуточный текст не чаще TELEGRAM_EDIT_INTERVAL."""
+        if time.monotonic() - self._last_edit < TELEGRAM_EDIT_INTERVAL:
+            return
+        # Незавершённая HTML-разметка ломает parse_mode, поэтому промежуточный текст — без неё.
+        # Промежуточную правку не ждём: при исчерпанном лимите чата она просто пропускается
+        text = self.header + text
+        await self._show(text[:TELEGRAM_MAX_LENGTH - 2] + " ▌", parse_mode=None, wait=False)
+
+    async def finish(self, text: str, sent: int = 0, on_sent: Optional[Callable[[int], None]] = None) -> bool:
+        """Выводит итоговый HTML; всё, что не влезло в одно сообщение, досылается отдельно.
+
+        Часть, которую Telegram не принял как HTML, отправляется простым текстом.
+        sent — сколько частей уже отправлено до перезапуска (они пропускаются);
+        on_sent — вызывается с числом отправленных частей после каждой из них."""
+        shown = True
+        for n, part in enumerate(split_html(html.escape(self.header) + text)):
+            if n < sent:
+                continue
+            if n == 0:
+                delivered = (await self._show(part, parse_mode="HTML")
+                             or await self._show(html_to_plain(part), parse_mode=None))
+            else:
+                delivered = await _send_part(self.chat_id, part)
+            shown = delivered and shown
+            if on_sent:
+                on_sent(n + 1)
+        return shown
+
+    async def _show(self, text: str, parse_mode: Optional[str], wait: bool = True) -> bool:
+        if text == self._shown:
+            return True
+        payload = {"chat_id": self.chat_id, "text": text}
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+
+        if self.message_id is None:
+            result = await _call_telegram(bot_token, "sendMessage", payload, wait)
+            if result:
+                self.message_id = result["message_id"]
+                if self._on_created:
+                    self._on_created(self.message_id)
+        else:
+            result = await _call_telegram(bot_token, "editMessageText",
+                                          {**payload, "message_id": self.message_id}, wait)
+
+        self._last_edit = time.monotonic()
+        if result:
+            self._shown = text
+        return result is not None
+
+
+def start_live_review(chat_id: str, message_id: Optional[int] = None,
+                      on_created: Optional[Callable[[int], None]] = None, header: str = "") -> Optional[LiveMessage]:
+    """Создаёт «живое» сообщение для потокового ревью (само сообщение появится с первым текстом).
+
+    message_id — уже отправленное ранее сообщение (уведомление о запуске), которое нужно править;
+    on_created — вызывается с ID нового сообщения, чтобы его можно было сохранить;
+    header — строка над текстом ревью (репозиторий и коммит), простой текст.
+    """
+    if not bot_token or not chat_id:
+        logger.warning("⚠️ Telegram credentials не настроены — потоковый вывод отключён")
+        return None
+    return LiveMessage(chat_id, message_id, on_created, header)
+
+
+async def notify_telegram_review(chat_id: str, repo_name: str, commit_id: str, files_count: int) -> Optional[int]:
+    """Уведомление о запуске code review → ID сообщения (в него потом встанет результат) или None."""
+
     if not bot_token or not chat_id:
         logger.warning("⚠️ Telegram credentials не настроены")
-        return False
-    
+        return None
+
     message = f"""
     🚀 <b>Code Review запущен!</b>
 
@@ -64,13 +324,18 @@ async def notify_telegram_review(chat_id: str, repo_name: str, commit_id: str, f
 
     ⏳ Анализ запущен...
         """.strip()
-    
-    return await send_telegram_message(bot_token, chat_id, message)
 
+    payload = {"chat_id": chat_id, "text": message, "parse_mode": "HTML"}
+    result = await _call_telegram(bot_token, "sendMessage", payload)
+    return result["message_id"] if result else None
+
+
+async def send_code_review(review_text: str, chat_id: str, message_id: Optional[int] = None, header: str = "",
+                           sent: int = 0, on_sent: Optional[Callable[[int], None]] = None) -> bool:
+    """Отправляет результат ревью кода в Telegram; с message_id — заменяет им уведомление о запуске.
 
-async def send_code_review(review_text: str, chat_id: str,) -> bool:
-    """Отправляет результат ревью кода в Telegram."""
+    sent и on_sent — как у LiveMessage.finish: продолжение доставки после перезапуска."""
     if not bot_token or not chat_id:
         logger.warning("⚠️ Telegram credentials не настроены — пропускаем отправку ревью")
         return False
-    return await send_telegram_message(bot_token, chat_id, review_text)
\ No newline at end of file
+    return await LiveMessage(chat_id, message_id, header=header).finish(review_text, sent, on_sent)
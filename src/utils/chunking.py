@@ -0,0 +1,91 @@
+# src/utils/chunking.py
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List
+from loguru import logger
+
+# Бюджет одного запроса к ИИ (в токенах) и грубая оценка символов на токен для кода
+REVIEW_CHUNK_TOKENS = int(os.getenv("REVIEW_CHUNK_TOKENS", "12000"))
+CHARS_PER_TOKEN = float(os.getenv("REVIEW_CHARS_PER_TOKEN", "3"))
+
+_HUNK_SPLIT_RE = re.compile(r"(?m)^(?=@@ )")
+_FILE_MARKER_RE = re.compile(r"(?m)^\s*#{1,4}\s*FILE:\s*`?(.+?)`?\s*$")
+
+
+@dataclass
+class Chunk:
+    """Один запрос к ИИ: несколько целых файлов или часть одного большого."""
+    paths: List[str]
+    text: str
+    part: int = 1
+    parts: int = 1
+
+
+def estimate_tokens(text: str) -> int:
+    """Оценка числа токенов без токенизатора."""
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def _split_text(text: str, budget: int) -> List[str]:
+    """Большой файл → куски по границам hunk'ов (дифф) или строк (файл целиком)."""
+    units = _HUNK_SPLIT_RE.split(text) if "\n@@ " in text else text.splitlines(keepends=True)
+    max_chars = int(budget * CHARS_PER_TOKEN)
+
+    pieces: List[str] = []
+    current = ""
+    for unit in units:
+        # Одна строка/hunk больше бюджета — режем по символам
+        while len(unit) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(unit[:max_chars])
+            unit = unit[max_chars:]
+        if current and estimate_tokens(current + unit) > budget:
+            pieces.append(current)
+            current = ""
+        current += unit
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def build_chunks(texts: Dict[str, str], budget: int = REVIEW_CHUNK_TOKENS) -> List[Chunk]:
+    """Раскладывает файлы по запросам в пределах бюджета, не разрывая файлы без необходимости."""
+    chunks: List[Chunk] = []
+    batch_paths: List[str] = []
+    batch_text = ""
+
+    for path in sorted(texts):
+        text = texts[path]
+        if estimate_tokens(text) > budget:
+            pieces = _split_text(text, budget)
+            chunks.extend(Chunk([path], piece, i, len(pieces)) for i, piece in enumerate(pieces, 1))
+            continue
+        if batch_paths and estimate_tokens(batch_text + text) > budget:
+            chunks.append(Chunk(batch_paths, batch_text))
+            batch_paths, batch_text = [], ""
+        batch_paths.append(path)
+        batch_text += text + "\n"
+
+    if batch_paths:
+        chunks.append(Chunk(batch_paths, batch_text))
+
+    logger.info(f"✂️ {len(texts)} файлов разложено в {len(chunks)} запросов (бюджет {budget} токенов)")
+    return chunks
+
+
+def split_review_by_file(review: str, paths: List[str]) -> Dict[str, str]:
+    """Разбирает ответ по маркерам «### FILE: path»; если разметка не совпала — ответ целиком на всю пачку."""
+    matches = list(_FILE_MARKER_RE.finditer(review))
+    sections: Dict[str, str] = {}
+    for n, match in enumerate(matches):
+        end = matches[n + 1].start() if n + 1 < len(matches) else len(review)
+        sections[match.group(1).strip()] = review[match.end():end].strip()
+
+    if set(sections) != set(paths):
+        logger.debug(f"🧩 Ответ не разбит по файлам (найдено {len(sections)} из {len(paths)})")
+        return {", ".join(paths): review}
+    return sections
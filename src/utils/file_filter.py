@@ -0,0 +1,132 @@
+# src/utils/file_filter.py
+
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Tuple
+from loguru import logger
+
+# Лимиты объёма: один файл и весь push (байты исходника/патча)
+REVIEW_MAX_FILE_BYTES = int(os.getenv("REVIEW_MAX_FILE_BYTES", "200000"))
+REVIEW_MAX_PUSH_BYTES = int(os.getenv("REVIEW_MAX_PUSH_BYTES", "1000000"))
+
+# Сгенерированное, вендоренное и lock-файлы — ревьюить бессмысленно
+GENERATED_PATTERNS = (
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "Pipfile.lock", "Cargo.lock",
+    "composer.lock", "Gemfile.lock", "go.sum", "uv.lock",
+    "**/vendor/**", "**/node_modules/**", "**/third_party/**", "dist/**", "build/**", "**/__pycache__/**",
+    "*.min.js", "*.min.css", "*.map", "*.bundle.js",
+    "*_pb2.py", "*_pb2_grpc.py", "*.pb.go", "*.pb.h", "*.pb.cc", "*.generated.*", "*.g.dart",
+)
+# Бинарные форматы отсекаем по расширению ещё до загрузки
+BINARY_EXTENSIONS = frozenset((
+    ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".ico", ".webp", ".pdf", ".zip", ".gz", ".tgz", ".bz2",
+    ".xz", ".7z", ".tar", ".jar", ".war", ".whl", ".egg", ".exe", ".dll", ".so", ".dylib", ".bin",
+    ".o", ".a", ".class", ".pyc", ".woff", ".woff2", ".ttf", ".otf", ".eot", ".mp3", ".mp4", ".mov",
+    ".avi", ".wav", ".ogg", ".sqlite", ".sqlite3", ".db", ".psd", ".xlsx", ".docx", ".pptx",
+))
+BINARY_MARKER = "<BINARY>"
+
+
+@lru_cache(maxsize=512)
+def _glob_regex(pattern: str) -> "re.Pattern[str]":
+    """Glob → regex: ** — любые каталоги, * и ? — в пределах одного имени.
+    Шаблон без «/» сравнивается с именем файла в любом каталоге."""
+    if "/" not in pattern:
+        pattern = "**/" + pattern
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return re.compile(regex + r"\Z")
+
+
+def matches_any(path: str, patterns: Iterable[str]) -> bool:
+    return any(_glob_regex(pattern).match(path) for pattern in patterns)
+
+
+def is_binary_path(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in BINARY_EXTENSIONS
+
+
+def is_binary_content(data: bytes) -> bool:
+    """Эвристика git: NUL-байт в первых 8000 байтах — бинарный файл."""
+    return b"\x00" in data[:8000]
+
+
+def skip_reason(path: str, settings: Dict[str, Any]) -> str:
+    """Причина пропуска файла до загрузки или пустая строка, если файл нужно ревьюить.
+
+    settings — настройки репозитория: include/exclude — списки glob-шаблонов.
+    Явный include возвращает файлы, отсечённые встроенными шаблонами."""
+    include = settings.get("include") or []
+    exclude = settings.get("exclude") or []
+    if include and not matches_any(path, include):
+        return "not included"
+    if matches_any(path, exclude):
+        return "excluded"
+    explicitly_included = bool(include)
+    if is_binary_path(path) and not explicitly_included:
+        return "binary"
+    if matches_any(path, GENERATED_PATTERNS) and not explicitly_included:
+        return "generated"
+    return ""
+
+
+def filter_paths(paths: Iterable[str], settings: Dict[str, Any]) -> Tuple[List[str], Dict[str, str]]:
+    """Отбор по шаблонам → (kept, {path: reason})."""
+    kept: List[str] = []
+    skipped: Dict[str, str] = {}
+    for path in paths:
+        reason = skip_reason(path, settings)
+        if reason:
+            skipped[path] = reason
+        else:
+            kept.append(path)
+    return kept, skipped
+
+
+def apply_budget(sizes: Dict[str, int], rank: Dict[str, float],
+                 max_file: int = REVIEW_MAX_FILE_BYTES,
+                 max_push: int = REVIEW_MAX_PUSH_BYTES) -> Tuple[List[str], Dict[str, str]]:
+    """Укладывает файлы в бюджет push по убыванию rank → (kept, {path: reason})."""
+    kept: List[str] = []
+    skipped: Dict[str, str] = {}
+    total = 0
+    for path in sorted(sizes, key=lambda p: (-rank.get(p, 0), p)):
+        size = sizes[path]
+        if size > max_file:
+            skipped[path] = "too large"
+        elif total + size > max_push:
+            skipped[path] = "push budget"
+        else:
+            kept.append(path)
+            total += size
+    if skipped:
+        logger.info(f"💰 Бюджет push: взято {len(kept)} файлов ({total} байт), пропущено {len(skipped)}")
+    return kept, skipped
+
+
+def summarize_skipped(skipped: Dict[str, str]) -> str:
+    """Короткая сводка пропущенных файлов для отчёта."""
+    if not skipped:
+        return ""
+    counts: Dict[str, int] = {}
+    for reason in skipped.values():
+        counts[reason] = counts.get(reason, 0) + 1
+    details = ", ".join(f"{reason}: {count}" for reason, count in sorted(counts.items()))
+    return f"⏭️ Пропущено файлов: {len(skipped)} ({details})"
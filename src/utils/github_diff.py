@@ -0,0 +1,173 @@
+# src/utils/github_diff.py
+
+import difflib
+import os
+import re
+from typing import Callable, Dict, List, Optional
+from loguru import logger
+from src.utils.file_filter import BINARY_MARKER
+from src.utils.github_webhook import GITHUB_API_BASE, fetch_files, _NULL_SHA, _github_get, _github_headers
+from src.utils.http_clients import github_client
+
+# Сколько строк контекста оставлять вокруг изменений
+REVIEW_DIFF_CONTEXT = int(os.getenv("REVIEW_DIFF_CONTEXT", "3"))
+# GitHub отдаёт патчи в compare API ровно с 3 строками контекста
+GITHUB_PATCH_CONTEXT = 3
+
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,\d+)? \+(\d+)(?:,\d+)? @@(.*)$")
+_NEW_RANGE_RE = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@", re.M)
+
+
+def is_diffable(before_sha: str) -> bool:
+    """Для нового бранча (before = 000…0) сравнивать не с чем."""
+    return bool(before_sha) and before_sha != _NULL_SHA
+
+
+def changed_ranges(patch: str) -> List[tuple[int, int]]:
+    """Диапазоны строк новой версии файла, которые покрывают hunk'и патча."""
+    ranges = []
+    for match in _NEW_RANGE_RE.finditer(patch):
+        start, count = int(match.group(1)), int(match.group(2) or 1)
+        # Hunk только с удалёнными строками указывает на строку перед удалением
+        ranges.append((start, start + max(count, 1) - 1))
+    return ranges
+
+
+def diff_block(file_path: str, patch: str) -> str:
+    return f"--- DIFF: {file_path} ---\n{patch}\n--- END DIFF ---\n"
+
+
+def _trim_hunk(old_start: int, new_start: int, section: str,
+               lines: List[str], context: int) -> List[str]:
+    """Один hunk → один или несколько hunk'ов с урезанным контекстом """
+    old_pos, new_pos = [], []
+    old_no, new_no = old_start, new_start
+    for line in lines:
+        old_pos.append(old_no)
+        new_pos.append(new_no)
+        if line.startswith(" "):
+            old_no += 1
+            new_no += 1
+        elif line.startswith("-"):
+            old_no += 1
+        elif line.startswith("+"):
+            new_no += 1
+
+    changes = [i for i, line in enumerate(lines) if line[:1] in ("+", "-")]
+    keep = set()
+    for i in changes:
+        keep.update(range(max(0, i - context), min(len(lines), i + context + 1)))
+    # Маркер «\ No newline at end of file» идёт вместе с предыдущей строкой
+    keep.update(i for i, line in enumerate(lines) if line.startswith("\\") and i - 1 in keep)
+
+    result: List[str] = []
+    run: List[int] = []
+    for i in sorted(keep) + [None]:
+        if run and (i is None or i != run[-1] + 1):
+            body = [lines[j] for j in run]
+            old_count = sum(1 for line in body if line[:1] in (" ", "-"))
+            new_count = sum(1 for line in body if line[:1] in (" ", "+"))
+            first_old = old_pos[run[0]] if old_count else old_pos[run[0]] - 1
+            first_new = new_pos[run[0]] if new_count else new_pos[run[0]] - 1
+            result.append(f"@@ -{first_old},{old_count} +{first_new},{new_count} @@{section}")
+            result.extend(body)
+            run = []
+        if i is not None:
+            run.append(i)
+    return result
+
+
+def trim_patch_context(patch: str, context: int) -> str:
+    """Урезает контекст патча GitHub до context строк вокруг изменений."""
+    if context >= GITHUB_PATCH_CONTEXT:
+        return patch
+
+    out: List[str] = []
+    header = None
+    lines: List[str] = []
+    for line in patch.splitlines() + [None]:
+        match = _HUNK_RE.match(line) if line is not None else None
+        if line is None or match:
+            if header:
+                out.extend(_trim_hunk(int(header.group(1)), int(header.group(2)),
+                                      header.group(3), lines, context))
+            header, lines = match, []
+        elif header:
+            lines.append(line)
+    return "\n".join(out)
+
+
+async def fetch_compare(owner: str, repo: str, before_sha: str, after_sha: str,
+                        github_token: str) -> tuple[List[Dict], str]:
+    """Compare API before...after одним запросом → (files, error_msg) """
+    url = f"{GITHUB_API_BASE}/repos/{owner}/{repo}/compare/{before_sha}...{after_sha}"
+    logger.debug(f"🔀 Запрашиваем сравнение {before_sha[:7]}...{after_sha[:7]}")
+    resp = await _github_get(github_client(), url, _github_headers(github_token), "github_compare")
+    if resp.status_code != 200:
+        msg = f"❌ Compare {owner}/{repo} {before_sha[:7]}...{after_sha[:7]}: {resp.status_code}"
+        logger.error(msg)
+        return [], msg
+
+    files = resp.json().get("files", [])
+    if len(files) >= 300:
+        logger.warning("✂️ Compare API вернул максимум (300) файлов — часть изменений может быть пропущена")
+    return files, ""
+
+
+async def _local_diffs(owner: str, repo: str, before_sha: str, after_sha: str,
+                       files: List[Dict], github_token: str, context: int) -> tuple[Dict[str, str], str]:
+    """Диффы с произвольным контекстом, посчитанные локально по двум версиям файлов → ({path: patch}, error_msg)
+
+    Файлы, одну из версий которых скачать не удалось или которые оказались бинарными, в результат не попадают."""
+    old_paths = {f["filename"]: f.get("previous_filename", f["filename"])
+                 for f in files if f["status"] != "added"}
+    new_paths = [f["filename"] for f in files]
+
+    before, error = await fetch_files(owner, repo, before_sha, sorted(set(old_paths.values())), github_token)
+    if error:
+        return {}, error
+    after, error = await fetch_files(owner, repo, after_sha, new_paths, github_token)
+    if error:
+        return {}, error
+
+    diffs: Dict[str, str] = {}
+    for path in new_paths:
+        old_text = before.get(old_paths[path], "<ERROR: not found>") if path in old_paths else ""
+        new_text = after.get(path, "<ERROR: not found>")
+        if any(text.startswith("<ERROR") or text == BINARY_MARKER for text in (old_text, new_text)):
+            logger.warning(f"⚠️ Дифф {path} не посчитан: версия файла не загружена или бинарная")
+            continue
+        diff = difflib.unified_diff(old_text.splitlines(), new_text.splitlines(),
+                                    fromfile=f"a/{old_paths.get(path, path)}", tofile=f"b/{path}",
+                                    n=context, lineterm="")
+        patch = "\n".join(diff)
+        # Как и у GitHub, файл без изменений содержимого (права, переименование) идёт без patch
+        if patch:
+            diffs[path] = patch
+    return diffs, ""
+
+
+async def fetch_diffs(owner: str, repo: str, before_sha: str, after_sha: str,
+                      github_token: str, context: int = REVIEW_DIFF_CONTEXT,
+                      select: Optional[Callable[[List[Dict]], List[Dict]]] = None) -> tuple[Dict[str, str], str]:
+    """Патчи изменённых и добавленных файлов → ({path: patch}, error_msg)
+
+    select — отбор файлов compare (фильтры, бюджет) до обработки патчей и локальных диффов """
+    files, error = await fetch_compare(owner, repo, before_sha, after_sha, github_token)
+    if error:
+        return {}, error
+
+    files = [f for f in files if f.get("status") != "removed"]
+    if select is not None:
+        files = select(files)
+    if context > GITHUB_PATCH_CONTEXT:
+        diffs, error = await _local_diffs(owner, repo, before_sha, after_sha, files, github_token, context)
+        if error:
+            return {}, error
+    else:
+        # Бинарные и слишком большие файлы приходят без patch — пропускаем их
+        diffs = {f["filename"]: trim_patch_context(f["patch"], context) for f in files if f.get("patch")}
+
+    logger.success(f"✅ Получены диффы {len(diffs)} файлов ({sum(map(len, diffs.values()))} символов)")
+    return diffs, ""
+
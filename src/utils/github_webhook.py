@@ -1,14 +1,23 @@
+import asyncio
 import base64
 import hashlib
 import hmac
 import json
+import os
 from typing import Dict, List
 from fastapi import Request, Response, status
 from loguru import logger
 import httpx
 from urllib.parse import quote
+from src.utils.http_clients import github_client
+from src.utils.metrics import GITHUB_BYTES, STAGE_ERRORS, track
+from src.utils.file_filter import BINARY_MARKER, is_binary_content
 
-GITHUB_API_BASE = "https://api.github.com"
+GITHUB_API_BASE = os.getenv("GITHUB_API_BASE", "https://api.github.com")
+# Сколько файлов качаем параллельно
+GITHUB_FETCH_CONCURRENCY = int(os.getenv("GITHUB_FETCH_CONCURRENCY", "16"))
+# SHA, которым GitHub обозначает отсутствующий коммит (новая или удалённая ветка)
+_NULL_SHA = "0" * 40
 
 def _parse_signature(signature_header: str) -> tuple[str, str] | None:
     """Разбор подписи """
@@ -40,76 +49,142 @@ def verify_signature(payload_body: bytes, signature_header: str, secret: bytes)
     logger.info(f"✅ Подпись {'валидна' if is_valid else 'НЕВАЛИДНА'}")
     return is_valid
 
-async def _get_repo_info(client: httpx.AsyncClient, headers: Dict[str, str], 
-                        owner: str, repo: str) -> tuple[str, str] | None:
-    """Валидация repo+commit → repo_url, error_msg """
-    logger.debug(f"🌐 Запрашиваем метаданные репозитория: {owner}/{repo}")
-    repo_url = f"{GITHUB_API_BASE}/repos/{owner}/{repo}"
-    
-    repo_resp = await client.get(repo_url, headers=headers)
-    if repo_resp.status_code != 200:
-        msg = f"❌ Репозиторий {owner}/{repo}: {repo_resp.status_code}"
+async def _github_get(client: httpx.AsyncClient, url: str, headers: Dict[str, str],
+                      stage: str) -> httpx.Response:
+    """GET к GitHub API с замером задержки, объёма и ошибок для /metrics """
+    with track(stage):
+        resp = await client.get(url, headers=headers)
+    GITHUB_BYTES.inc(len(resp.content))
+    if resp.status_code >= 400:
+        STAGE_ERRORS.inc(stage=stage)
+    return resp
+
+def _github_headers(github_token: str) -> Dict[str, str]:
+    return {
+        "Authorization": f"token {github_token}",
+        "Accept": "application/vnd.github.v3+json",
+    }
+
+def file_block(file_path: str, body: str) -> str:
+    return f"--- FILE: {file_path} ---\n{body}\n--- END FILE ---\n"
+
+async def fetch_tree(client: httpx.AsyncClient, headers: Dict[str, str],
+                     repo_url: str, commit_sha: str) -> tuple[Dict[str, str], Dict[str, int], str]:
+    """Дерево коммита одним запросом → ({path: blob_sha}, {path: size}, error_msg) """
+    logger.debug(f"🌳 Запрашиваем дерево коммита {commit_sha[:7]}")
+    resp = await _github_get(client, f"{repo_url}/git/trees/{commit_sha}?recursive=1", headers, "github_tree")
+    if resp.status_code != 200:
+        msg = f"❌ Дерево {repo_url.rsplit('/repos/', 1)[-1]}@{commit_sha[:7]}: {resp.status_code}"
         logger.error(msg)
-        return None, msg
-    
-    logger.debug(f"✅ Репозиторий {owner}/{repo} найден")
-    return repo_url, ""
+        return {}, {}, msg
+
+    data = resp.json()
+    blobs = [item for item in data.get("tree", []) if item.get("type") == "blob"]
+    tree = {item["path"]: item["sha"] for item in blobs}
+    sizes = {item["path"]: item.get("size", 0) for item in blobs}
+    if data.get("truncated"):
+        # Для файлов, не попавших в усечённое дерево, сработает запасной путь через /contents
+        logger.warning(f"✂️ Дерево усечено GitHub: получено {len(tree)} файлов")
+    logger.debug(f"✅ Дерево получено: {len(tree)} файлов")
+    return tree, sizes, ""
+
+async def fetch_commit_tree(owner: str, repo: str, commit_sha: str,
+                            github_token: str) -> tuple[Dict[str, str], Dict[str, int], str]:
+    """Дерево коммита через общий клиент → ({path: blob_sha}, {path: size}, error_msg) """
+    return await fetch_tree(github_client(), _github_headers(github_token),
+                            f"{GITHUB_API_BASE}/repos/{owner}/{repo}", commit_sha)
+
+def _decode_text(data: bytes) -> str:
+    """Байты файла → текст; бинарное содержимое заменяется маркером, а не падает на decode """
+    if is_binary_content(data):
+        return BINARY_MARKER
+    return data.decode("utf-8", errors="replace")
+
+async def _fetch_blob(client: httpx.AsyncClient, headers: Dict[str, str],
+                      repo_url: str, blob_sha: str) -> str:
+    """Один blob → текст (сырые байты без base64-обёртки) """
+    raw_headers = {**headers, "Accept": "application/vnd.github.raw"}
+    resp = await _github_get(client, f"{repo_url}/git/blobs/{blob_sha}", raw_headers, "github_fetch")
+    if resp.status_code != 200:
+        logger.warning(f"⚠️ Не удалось загрузить blob {blob_sha[:7]}: {resp.status_code}")
+        return f"<ERROR: {resp.status_code}>"
+    return _decode_text(resp.content)
 
 async def _fetch_one_file(client: httpx.AsyncClient, headers: Dict[str, str], 
                          repo_url: str, file_path: str, commit_sha: str) -> str:
-    """Один файл → один блок """
+    """Один файл через /contents (запасной путь, если файла нет в дереве) """
     url = f"{repo_url}/contents/{quote(file_path)}?ref={commit_sha}"
     logger.debug(f"📥 Запрашиваем файл: {file_path} @ {commit_sha[:7]}")
     
     try:
-        resp = await client.get(url, headers=headers)
+        resp = await _github_get(client, url, headers, "github_fetch")
         if resp.status_code == 200:
             data = resp.json()
-            content = base64.b64decode(data["content"]).decode("utf-8")
+            content = _decode_text(base64.b64decode(data["content"]))
             logger.debug(f"✅ Успешно загружен: {file_path} ({len(content)} символов)")
-            return f"--- FILE: {file_path} ---\n{content}\n--- END FILE ---\n"
+            return content
         else:
             logger.warning(f"⚠️ Не удалось загрузить {file_path}: {resp.status_code}")
-            return f"--- FILE: {file_path} ---\n<ERROR: {resp.status_code}>\n--- END FILE ---\n"
+            return f"<ERROR: {resp.status_code}>"
     except Exception as e:
         logger.error(f"💥 Ошибка при загрузке {file_path}: {e}")
-        return f"--- FILE: {file_path} ---\n<ERROR: {e}>\n--- END FILE ---\n"
+        return f"<ERROR: {e}>"
 
-async def fetch_file_contents(owner: str, repo: str, commit_sha: str, 
-                             file_paths: List[str], github_token: str) -> str:
-    logger.info(f"📂 Запрошено содержимое {len(file_paths)} файлов из {owner}/{repo}@{commit_sha[:7]}")
-    if not file_paths:
-        logger.warning("📭 Список файлов пуст — возвращаем пустую строку")
-        return ""
+async def fetch_files(owner: str, repo: str, commit_sha: str, file_paths: List[str],
+                      github_token: str, tree: Dict[str, str] | None = None) -> tuple[Dict[str, str], str]:
+    """Параллельная загрузка файлов коммита → ({path: content}, error_msg) """
+    client = github_client()
+    headers = _github_headers(github_token)
+    repo_url = f"{GITHUB_API_BASE}/repos/{owner}/{repo}"
 
-    headers = {
-        "Authorization": f"token {github_token}",
-        "Accept": "application/vnd.github.v3+json",
-    }
-    all_content: List[str] = []
-    
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        repo_url, error = await _get_repo_info(client, headers, owner, repo)
+    if tree is None:
+        tree, _, error = await fetch_tree(client, headers, repo_url, commit_sha)
         if error:
-            return error
-        
-        logger.info(f"🔄 Начинаем загрузку файлов...")
-        for file_path in file_paths:
-            content = await _fetch_one_file(client, headers, repo_url, file_path, commit_sha)
-            all_content.append(content)
-    
-    logger.success(f"✅ Загружено {len(file_paths)} файлов")
-    return "\n".join(all_content)
+            return {}, error
+
+    semaphore = asyncio.Semaphore(GITHUB_FETCH_CONCURRENCY)
+
+    async def _bounded(coro_factory):
+        async with semaphore:
+            return await coro_factory()
+
+    async def _blob_task(blob_sha: str) -> str:
+        try:
+            return await _fetch_blob(client, headers, repo_url, blob_sha)
+        except Exception as e:
+            logger.error(f"💥 Ошибка при загрузке blob {blob_sha[:7]}: {e}")
+            return f"<ERROR: {e}>"
 
-async def handle_github_webhook(request: Request, secret: bytes, token: str) -> Response | Dict:
-    """Главная webhook """
+    # Одинаковые blob'ы (копии файлов) скачиваем один раз
+    blob_shas = sorted({tree[path] for path in file_paths if path in tree})
+    fallback_paths = [path for path in file_paths if path not in tree]
+    logger.info(f"🔄 Загрузка: {len(blob_shas)} blob'ов, {len(fallback_paths)} через /contents, "
+                f"параллельно до {GITHUB_FETCH_CONCURRENCY}")
+
+    blob_results = await asyncio.gather(
+        *(_bounded(lambda sha=sha: _blob_task(sha)) for sha in blob_shas)
+    )
+    fallback_results = await asyncio.gather(
+        *(_bounded(lambda p=p: _fetch_one_file(client, headers, repo_url, p, commit_sha))
+          for p in fallback_paths)
+    )
+    blobs = dict(zip(blob_shas, blob_results))
+    fallback = dict(zip(fallback_paths, fallback_results))
+
+    contents = {path: blobs[tree[path]] if path in tree else fallback[path] for path in file_paths}
+    return contents, ""
+
+async def handle_github_webhook(request: Request, secret: bytes) -> Response | Dict:
+    """Главная webhook: проверка подписи и разбор push без обращения к GitHub API """
     logger.info("🚀 Получен GitHub webhook")
     
     payload = await request.body()
     signature = request.headers.get("X-Hub-Signature-256", "")
     logger.debug(f"🔑 Подпись: {signature[:50]}...")
 
-    if not verify_signature(payload, signature, secret):
+    with track("signature"):
+        is_valid = verify_signature(payload, signature, secret)
+    if not is_valid:
         logger.error("🛑 Отклонено: подпись не прошла проверку")
         return Response(status_code=status.HTTP_401_UNAUTHORIZED)
     
@@ -128,33 +203,46 @@ async def handle_github_webhook(request: Request, secret: bytes, token: str) ->
     
     repo_id = event["repository"]["id"]
     logger.info(f"Вебхук от репозитория: (ID: {repo_id})")
+    # Удаление ветки и push тегов ревьюить нечего
+    if event.get("deleted") or event.get("after", _NULL_SHA) == _NULL_SHA:
+        logger.info("⏭️ Игнорируем: ветка удалена")
+        return {"status": "ignored"}
+    if not event.get("ref", "").startswith("refs/heads/"):
+        logger.info(f"⏭️ Игнорируем: push не в ветку ({event.get('ref', '')})")
+        return {"status": "ignored"}
 
-    # Собираем файлы из всех коммитов
+    # Собираем файлы из всех коммитов (по порядку: удалённый позже файл не ревьюим)
     files = set()
+    removed = set()
     commits = event.get("commits", [])
     logger.debug(f"🧾 Найдено коммитов: {len(commits)}")
     for commit in commits:
         added = commit.get("added", [])
         modified = commit.get("modified", [])
+        deleted = commit.get("removed", [])
         files.update(added)
         files.update(modified)
-        logger.debug(f"  → +{len(added)} added, +{len(modified)} modified")
+        files.difference_update(deleted)
+        removed.difference_update(added)
+        removed.update(deleted)
+        logger.debug(f"  → +{len(added)} added, +{len(modified)} modified, -{len(deleted)} removed")
     
     if not files:
-        logger.warning("📭 Нет изменённых или добавленных файлов в push")
-        return {"status": "review_queued", "repo": event["repository"]["full_name"], "commit": event["after"][:7], "files": 0, "contents": ""}
-
-    owner, repo_name = event["repository"]["full_name"].split("/", 1)
-    logger.info(f"📦 Репозиторий: {owner}/{repo_name}, коммит: {event['after'][:7]}")
+        logger.warning("📭 Нет изменённых или добавленных файлов в push — ревью не нужно")
+        return {"status": "ignored"}
 
-    contents = await fetch_file_contents(owner, repo_name, event["after"], list(files), token)
-    
-    logger.success(f"📤 Возвращаем результат: {len(files)} файлов, {len(contents)} символов")
+    logger.info(f"📦 Репозиторий: {event['repository']['full_name']}, коммит: {event['after'][:7]}")
+    logger.success(f"📤 Возвращаем результат: {len(files)} файлов")
     return {
         "status": "review_queued",
         "repo": event["repository"]["full_name"],
         "commit": event["after"][:7],
+        "sha": event["after"],
+        "before": event.get("before", ""),
         "files": len(files),
-        "contents": contents,
+        "file_paths": sorted(files),
+        "removed_paths": sorted(removed),
+        "ref": event.get("ref", ""),
+        "delivery_id": request.headers.get("X-GitHub-Delivery", ""),
         "repo_id": repo_id
     }
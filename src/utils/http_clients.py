@@ -0,0 +1,92 @@
+# src/utils/http_clients.py
+
+import os
+from typing import Optional
+import aiohttp
+import httpx
+from loguru import logger
+from mistralai import Mistral
+from src.utils.llm_scheduler import observe_response
+
+# Размеры keep-alive пулов и время жизни простаивающего соединения (секунды)
+GITHUB_POOL_SIZE = int(os.getenv("GITHUB_POOL_SIZE", "16"))
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "8"))
+MISTRAL_POOL_SIZE = int(os.getenv("MISTRAL_POOL_SIZE", "8"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+GITHUB_HTTP2 = os.getenv("GITHUB_HTTP2", "1") == "1"
+MISTRAL_TIMEOUT = float(os.getenv("MISTRAL_TIMEOUT", "600"))
+# Адрес API Mistral (переопределяется для локальных заглушек в bench/)
+MISTRAL_SERVER_URL = os.getenv("MISTRAL_SERVER_URL") or None
+
+_github: Optional[httpx.AsyncClient] = None
+_telegram: Optional[aiohttp.ClientSession] = None
+_mistral: Optional[Mistral] = None
+_mistral_http: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    """HTTP/2 в httpx требует опционального пакета h2."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _httpx_limits(size: int) -> httpx.Limits:
+    return httpx.Limits(max_connections=size, max_keepalive_connections=size,
+                        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+
+
+def github_client() -> httpx.AsyncClient:
+    """Общий клиент GitHub API (создаётся при первом обращении, если не запущен через startup)."""
+    global _github
+    if _github is None or _github.is_closed:
+        http2 = GITHUB_HTTP2 and _http2_available()
+        _github = httpx.AsyncClient(timeout=30.0, http2=http2, limits=_httpx_limits(GITHUB_POOL_SIZE))
+        logger.debug(f"🔌 Создан клиент GitHub API (http2={http2}, пул={GITHUB_POOL_SIZE})")
+    return _github
+
+
+def telegram_session() -> aiohttp.ClientSession:
+    """Общая сессия Telegram Bot API; вызывать только из работающего event loop."""
+    global _telegram
+    if _telegram is None or _telegram.closed:
+        connector = aiohttp.TCPConnector(limit=TELEGRAM_POOL_SIZE, keepalive_timeout=HTTP_KEEPALIVE_EXPIRY)
+        _telegram = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=10))
+        logger.debug(f"🔌 Создана сессия Telegram (пул={TELEGRAM_POOL_SIZE})")
+    return _telegram
+
+
+def mistral_client() -> Mistral:
+    """Общий клиент Mistral поверх собственного keep-alive пула httpx."""
+    global _mistral, _mistral_http
+    if _mistral is None or _mistral_http is None or _mistral_http.is_closed:
+        # Хук видит каждый ответ (и поток) — по нему планировщик подстраивает параллельность
+        _mistral_http = httpx.AsyncClient(timeout=MISTRAL_TIMEOUT, limits=_httpx_limits(MISTRAL_POOL_SIZE),
+                                          event_hooks={"response": [observe_response]})
+        _mistral = Mistral(api_key=os.getenv("MISTRAL_API_KEY"), server_url=MISTRAL_SERVER_URL,
+                           async_client=_mistral_http)
+        logger.debug(f"🔌 Создан клиент Mistral (пул={MISTRAL_POOL_SIZE})")
+    return _mistral
+
+
+async def startup() -> None:
+    """Создаёт все клиенты при старте приложения (FastAPI lifespan)."""
+    github_client()
+    telegram_session()
+    mistral_client()
+    logger.info("🔌 HTTP-клиенты GitHub, Telegram и Mistral готовы")
+
+
+async def shutdown() -> None:
+    """Закрывает все клиенты при остановке приложения."""
+    global _github, _telegram, _mistral, _mistral_http
+    if _github is not None and not _github.is_closed:
+        await _github.aclose()
+    if _telegram is not None and not _telegram.closed:
+        await _telegram.close()
+    if _mistral_http is not None and not _mistral_http.is_closed:
+        await _mistral_http.aclose()
+    _github = _telegram = _mistral = _mistral_http = None
+    logger.info("🔌 HTTP-клиенты закрыты")
@@ -0,0 +1,172 @@
+# src/utils/job_store.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+# SQLite (WAL) с задачами ревью лежит рядом с маппингами (json/)
+_DB_FILE = Path(os.getenv("JOB_STORE_PATH", Path(__file__).parent.parent / "json" / "jobs.sqlite3"))
+JOB_STORE_ENABLED = os.getenv("JOB_STORE_ENABLED", "1") == "1"
+# Сколько хранить завершённые задачи (секунды)
+JOB_STORE_RETENTION = int(os.getenv("JOB_STORE_RETENTION", str(7 * 24 * 3600)))
+
+# Этапы задачи по порядку; после перезапуска работа продолжается с последнего пройденного
+STAGES = ("accepted", "notified", "fetched", "reviewed", "delivered")
+
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    """Открывает (при первом обращении) базу задач."""
+    global _conn
+    if _conn is None:
+        _DB_FILE.parent.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(_DB_FILE, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, payload TEXT NOT NULL, stage TEXT NOT NULL,"
+            " status TEXT NOT NULL, artifacts TEXT NOT NULL DEFAULT '{}', error TEXT,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        # Тяжёлые данные (загруженные файлы, итоговый отчёт) — отдельно, задача хранит только ссылку
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_contents ("
+            " job_id TEXT NOT NULL, name TEXT NOT NULL, body TEXT NOT NULL, PRIMARY KEY (job_id, name))"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        logger.debug(f"🗄️ Хранилище задач открыто: {_DB_FILE}")
+    return _conn
+
+
+def is_enabled() -> bool:
+    return JOB_STORE_ENABLED
+
+
+def create_job(job_id: str, payload: Dict[str, Any]) -> None:
+    """Фиксирует принятый push до того, как за него возьмётся воркер."""
+    if not is_enabled():
+        return
+    now = time.time()
+    with _lock:
+        conn = _connect()
+        conn.execute(
+            "INSERT OR IGNORE INTO jobs (id, payload, stage, status, created_at, updated_at)"
+            " VALUES (?, ?, 'accepted', 'queued', ?, ?)",
+            (job_id, json.dumps(payload, ensure_ascii=False), now, now),
+        )
+        conn.commit()
+
+
+def update_payload(job_id: str, payload: Dict[str, Any]) -> None:
+    """Заменяет payload ещё не взятой в работу задачи (push'и, склеенные в окне debounce)."""
+    if not is_enabled() or not job_id:
+        return
+    with _lock:
+        conn = _connect()
+        conn.execute("UPDATE jobs SET payload = ?, updated_at = ? WHERE id = ? AND stage = 'accepted'",
+                     (json.dumps(payload, ensure_ascii=False), time.time(), job_id))
+        conn.commit()
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Задача с этапом и артефактами или None."""
+    if not is_enabled() or not job_id:
+        return None
+    with _lock:
+        row = _connect().execute(
+            "SELECT payload, stage, status, artifacts, error, created_at FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+    if row is None:
+        return None
+    return {"id": job_id, "payload": json.loads(row[0]), "stage": row[1], "status": row[2],
+            "artifacts": json.loads(row[3]), "error": row[4], "created_at": row[5]}
+
+
+def advance_job(job_id: str, stage: str, **artifacts: Any) -> None:
+    """Отмечает пройденный этап и дописывает артефакты (ID сообщений, флаги доставки)."""
+    if not is_enabled() or not job_id:
+        return
+    with _lock:
+        conn = _connect()
+        row = conn.execute("SELECT stage, artifacts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return
+        # Этап только растёт: повторная запись более раннего этапа его не откатывает
+        new_stage = max(row[0], stage, key=STAGES.index)
+        merged = {**json.loads(row[1]), **artifacts}
+        conn.execute(
+            "UPDATE jobs SET stage = ?, status = 'running', artifacts = ?, updated_at = ? WHERE id = ?",
+            (new_stage, json.dumps(merged, ensure_ascii=False), time.time(), job_id),
+        )
+        conn.commit()
+    logger.debug(f"📍 Задача {job_id}: этап {new_stage}")
+
+
+def finish_job(job_id: str, status: str, error: Optional[str] = None) -> None:
+    """Помечает задачу завершённой (done/failed) — после перезапуска она не возобновляется."""
+    if not is_enabled() or not job_id:
+        return
+    with _lock:
+        conn = _connect()
+        conn.execute("UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                     (status, error, time.time(), job_id))
+        conn.commit()
+
+
+def save_content(job_id: str, name: str, value: Any) -> None:
+    """Сохраняет тяжёлый артефакт задачи (JSON-сериализуемый)."""
+    if not is_enabled() or not job_id:
+        return
+    with _lock:
+        conn = _connect()
+        conn.execute("INSERT OR REPLACE INTO job_contents (job_id, name, body) VALUES (?, ?, ?)",
+                     (job_id, name, json.dumps(value, ensure_ascii=False)))
+        conn.commit()
+
+
+def load_content(job_id: str, name: str) -> Optional[Any]:
+    if not is_enabled() or not job_id:
+        return None
+    with _lock:
+        row = _connect().execute(
+            "SELECT body FROM job_contents WHERE job_id = ? AND name = ?", (job_id, name)
+        ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def unfinished_jobs() -> List[Dict[str, Any]]:
+    """Задачи, прерванные остановкой процесса, — по времени поступления."""
+    if not is_enabled():
+        return []
+    with _lock:
+        ids = [row[0] for row in _connect().execute(
+            "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+        )]
+    return [job for job in map(get_job, ids) if job is not None]
+
+
+def prune_jobs() -> None:
+    """Удаляет завершённые задачи старше JOB_STORE_RETENTION вместе с их содержимым."""
+    if not is_enabled():
+        return
+    cutoff = time.time() - JOB_STORE_RETENTION
+    with _lock:
+        conn = _connect()
+        conn.execute(
+            "DELETE FROM job_contents WHERE job_id IN"
+            " (SELECT id FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?)", (cutoff,)
+        )
+        removed = conn.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (cutoff,)
+        ).rowcount
+        conn.commit()
+    if removed:
+        logger.info(f"🧹 Удалено {removed} старых задач из хранилища")
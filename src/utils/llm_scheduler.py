@@ -0,0 +1,149 @@
+# src/utils/llm_scheduler.py
+
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+import httpx
+from loguru import logger
+
+# Потолок одновременных запросов к Mistral; фактический лимит подстраивается под ответы API
+MISTRAL_MAX_CONCURRENCY = int(os.getenv("MISTRAL_MAX_CONCURRENCY", "4"))
+# Повторы при 429, 5xx и сетевых ошибках: экспоненциальная пауза со случайным разбросом
+MISTRAL_MAX_RETRIES = int(os.getenv("MISTRAL_MAX_RETRIES", "4"))
+MISTRAL_BACKOFF_BASE = float(os.getenv("MISTRAL_BACKOFF_BASE", "1"))
+MISTRAL_BACKOFF_MAX = float(os.getenv("MISTRAL_BACKOFF_MAX", "60"))
+# Доля оставшейся квоты из заголовков rate limit, ниже которой параллельность снижается
+MISTRAL_RATELIMIT_LOW = float(os.getenv("MISTRAL_RATELIMIT_LOW", "0.1"))
+
+_RETRYABLE_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class AdaptiveLimiter:
+    """Семафор с подвижным лимитом (AIMD): 429 делит лимит пополам, серия успехов прибавляет 1.
+
+    pause() останавливает выдачу слотов до сброса квоты (retry-after / reset из заголовков)."""
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.active = 0
+        self._successes = 0
+        self._paused_until = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> None:
+        requeued = False
+        while self.active >= self.limit or self._paused_until > time.monotonic():
+            pause = self._paused_until - time.monotonic()
+            waiter = asyncio.get_running_loop().create_future()
+            # Разбуженный, но не успевший занять слот, остаётся первым в очереди
+            if requeued:
+                self._waiters.appendleft(waiter)
+            else:
+                self._waiters.append(waiter)
+            requeued = True
+            try:
+                await asyncio.wait({waiter}, timeout=pause if pause > 0 else None)
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.active += 1
+
+    def release(self) -> None:
+        self.active -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        free = self.limit - self.active
+        while self._waiters and free > 0:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def on_success(self) -> None:
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            self._successes = 0
+            logger.debug(f"📈 Лимит параллельных запросов Mistral: {self.limit}")
+            self._wake()
+
+    def on_throttled(self, retry_after: float) -> None:
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+        self.pause(retry_after)
+        logger.warning(f"📉 Mistral 429: лимит параллельных запросов {self.limit}, пауза {retry_after:.1f} с")
+
+    def on_quota_low(self) -> None:
+        if self.limit > 1:
+            self.limit -= 1
+            logger.debug(f"📉 Квота Mistral на исходе: лимит параллельных запросов {self.limit}")
+        self._successes = 0
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+limiter = AdaptiveLimiter(MISTRAL_MAX_CONCURRENCY)
+
+
+def _seconds(value: Optional[str]) -> Optional[float]:
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _quota(headers: httpx.Headers) -> tuple[Optional[float], Optional[float]]:
+    """Наименьшая доля оставшейся квоты и время её сброса из заголовков *ratelimit*."""
+    lowest: Optional[float] = None
+    reset: Optional[float] = None
+    values: Dict[str, str] = {name.lower(): value for name, value in headers.items()}
+    for name, value in values.items():
+        if "ratelimit" not in name:
+            continue
+        if "reset" in name:
+            reset = _seconds(value)
+            # Некоторые API отдают момент сброса (unix time), а не число секунд
+            if reset and reset > 1e9:
+                reset = max(0.0, reset - time.time())
+        elif "remaining" in name and "month" not in name:
+            limit = _seconds(values.get(name.replace("remaining", "limit")))
+            remaining = _seconds(value)
+            if limit and remaining is not None:
+                share = remaining / limit
+                lowest = share if lowest is None else min(lowest, share)
+    return lowest, reset
+
+
+async def observe_response(response: httpx.Response) -> None:
+    """Event hook httpx-клиента Mistral: подстраивает параллельность под ответы и заголовки квоты."""
+    if response.status_code == 429:
+        limiter.on_throttled(_seconds(response.headers.get("retry-after")) or MISTRAL_BACKOFF_BASE)
+        return
+    if response.status_code >= 400:
+        return
+
+    share, reset = _quota(response.headers)
+    if share is not None and share < MISTRAL_RATELIMIT_LOW:
+        limiter.on_quota_low()
+        if share == 0 and reset:
+            limiter.pause(reset)
+    else:
+        limiter.on_success()
+
+
+def is_retryable(error: Exception) -> bool:
+    """Стоит ли повторять запрос: перегрузка, ошибки сервера и сети."""
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    return getattr(error, "status_code", None) in _RETRYABLE_STATUSES
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full jitter: случайная пауза до base·2^attempt, не больше MISTRAL_BACKOFF_MAX."""
+    return random.uniform(0, min(MISTRAL_BACKOFF_MAX, MISTRAL_BACKOFF_BASE * 2 ** attempt))
@@ -0,0 +1,128 @@
+# src/utils/metrics.py
+
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple
+
+# Границы корзин гистограмм задержек (секунды): от подписи до многоминутной генерации
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Монотонный счётчик с метками."""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help_text, labels
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())]
+
+
+class Gauge:
+    """Текущее значение, вычисляемое колбэком в момент выдачи /metrics."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, callback: Callable[[], float]):
+        self.name, self.help, self._callback = name, help_text, callback
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {_format_value(self._callback())}"]
+
+
+class Histogram:
+    """Гистограмма с кумулятивными корзинами в формате Prometheus."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help_text, labels, buckets
+        # метки → (счётчики по корзинам, сумма, количество)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self) -> List[str]:
+        lines: List[str] = []
+        for key, (counts, total, count) in sorted(self._values.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {bucket_count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+_registry: List = []
+
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+
+STAGE_LATENCY = _register(Histogram("review_stage_duration_seconds",
+                                    "Длительность этапов обработки webhook и ревью", ("stage",)))
+STAGE_ERRORS = _register(Counter("review_stage_errors_total", "Ошибки по этапам", ("stage",)))
+WEBHOOKS = _register(Counter("webhooks_total", "Входящие webhook по результату обработки", ("result",)))
+LLM_TOKENS = _register(Counter("mistral_tokens_total", "Токены Mistral по типу", ("kind",)))
+LLM_REQUESTS = _register(Counter("mistral_requests_total", "Запросы к Mistral по модели", ("model",)))
+LLM_RETRIES = _register(Counter("mistral_retries_total", "Повторы запросов к Mistral по причине", ("reason",)))
+GITHUB_BYTES = _register(Counter("github_fetched_bytes_total", "Байт загружено из GitHub API"))
+TELEGRAM_MESSAGES = _register(Counter("telegram_requests_total", "Запросы к Telegram Bot API", ("method",)))
+TELEGRAM_RETRIES = _register(Counter("telegram_retries_total", "Повторы запросов к Telegram по причине", ("reason",)))
+
+
+def register_gauge(name: str, help_text: str, callback: Callable[[], float]) -> None:
+    """Регистрирует gauge, значение которого берётся из колбэка (глубина очереди, доля кэша и т.п.)."""
+    _register(Gauge(name, help_text, callback))
+
+
+@contextmanager
+def track(stage: str) -> Iterator[None]:
+    """Замеряет длительность этапа; исключение засчитывается как ошибка этапа."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus (exposition format 0.0.4)."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
@@ -1,21 +1,23 @@
 # mistral_client.py
+import asyncio
+import hashlib
 import os
+import time
+from typing import Awaitable, Callable
 from mistralai import Mistral
 from loguru import logger
+from src.utils.http_clients import mistral_client
+from src.utils.metrics import LLM_REQUESTS, LLM_RETRIES, LLM_TOKENS, track
+from src.utils.chunking import estimate_tokens
+from src.utils.llm_scheduler import MISTRAL_MAX_RETRIES, backoff_delay, is_retryable, limiter
+
+DeltaCallback = Callable[[str], Awaitable[None]]
 
 API_KEY = os.getenv("MISTRAL_API_KEY")
 if not API_KEY:
     raise EnvironmentError("Необходимо установить переменную окружения MISTRAL_API_KEY")
 
-# Используем асинхронный клиент
-async def get_long_completion(user_prompt: str) -> str:
-    """
-    Асинхронно генерирует максимально длинный ответ от Mistral AI с учётом системного промта.
-
-    :param user_prompt: Запрос от пользователя (обычно содержимое кода для ревью).
-    :return: Текст технического ревью от модели.
-    """
-    system_prompt = """Ты — опытный, профессиональный программист, проводишь код-ревью. Ты придерживаешься правил структурного программирования. У тебя есть вот правила написания кода: 
+SYSTEM_PROMPT = """Ты — опытный, профессиональный программист, проводишь код-ревью. Ты придерживаешься правил структурного программирования. У тебя есть вот правила написания кода: 
             # Принципы структурного программирования
             Становление и развитие структурного программирования связано с именем Эдсгера Дейкстры.
             * Принцип 1. Следует отказаться от использования оператора безусловного перехода goto.
@@ -34,37 +36,140 @@ async def get_long_completion(user_prompt: str) -> str:
             4. Вложенность любых блоков не должна превышать 4
             5. Размер функций ограничен по строкам и составляет 40-50 строк. Тебе нужно сделать ревью кода используя эти принципы.
             Результатом проверки напиши короткий технический обзор для программиста."""
+MODEL = "mistral-large-latest"
+TEMPERATURE = 0.7
+MAX_RESPONSE_TOKENS = 32768
 
-    max_response_tokens = 32768
-    temperature: float = 0.7
+# Небольшие запросы (до MISTRAL_SMALL_MAX_TOKENS токенов на входе) уходят в быструю дешёвую модель;
+# пустое MISTRAL_SMALL_MODEL — всегда MODEL
+MISTRAL_SMALL_MODEL = os.getenv("MISTRAL_SMALL_MODEL", "mistral-small-latest")
+MISTRAL_SMALL_MAX_TOKENS = int(os.getenv("MISTRAL_SMALL_MAX_TOKENS", "1500"))
+# Бюджет ответа растёт с размером входа: MIN + RATIO·вход, но не больше MAX_RESPONSE_TOKENS
+MISTRAL_MIN_RESPONSE_TOKENS = int(os.getenv("MISTRAL_MIN_RESPONSE_TOKENS", "1024"))
+MISTRAL_RESPONSE_RATIO = float(os.getenv("MISTRAL_RESPONSE_RATIO", "0.5"))
 
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_prompt}
-    ]
+# Минимальный интервал между стартами запросов (параллельность регулирует llm_scheduler)
+MISTRAL_MIN_INTERVAL = float(os.getenv("MISTRAL_MIN_INTERVAL", "0"))
 
-    logger.info(
-            f"✅ Отправлен запрос в ИИ. "
+_pace_lock = asyncio.Lock()
+_last_start = 0.0
+
+
+def prompt_fingerprint() -> str:
+    """Хеш системного промта, моделей и температуры — меняется при любой правке настроек ревью."""
+    raw = f"{SYSTEM_PROMPT}\x00{MODEL}\x00{TEMPERATURE}\x00{MISTRAL_SMALL_MODEL}\x00{MISTRAL_SMALL_MAX_TOKENS}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def choose_model(prompt_tokens: int) -> str:
+    """Маленький запрос — маленькой модели, большая модель только когда она нужна."""
+    if MISTRAL_SMALL_MODEL and prompt_tokens <= MISTRAL_SMALL_MAX_TOKENS:
+        return MISTRAL_SMALL_MODEL
+    return MODEL
+
+
+def response_budget(prompt_tokens: int) -> int:
+    """max_tokens по размеру входа: короткому диффу не нужен ответ на 32k токенов."""
+    return min(MAX_RESPONSE_TOKENS, MISTRAL_MIN_RESPONSE_TOKENS + int(prompt_tokens * MISTRAL_RESPONSE_RATIO))
+
+async def _wait_for_slot() -> None:
+    """Выдерживает MISTRAL_MIN_INTERVAL между стартами запросов (лимит запросов в секунду)."""
+    global _last_start
+    async with _pace_lock:
+        delay = _last_start + MISTRAL_MIN_INTERVAL - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        _last_start = time.monotonic()
+
+def _count_usage(usage) -> None:
+    """Учитывает токены запроса/ответа в метриках."""
+    if usage is None:
+        return
+    LLM_TOKENS.inc(usage.prompt_tokens or 0, kind="prompt")
+    LLM_TOKENS.inc(usage.completion_tokens or 0, kind="completion")
+
+async def _stream_completion(mistral: Mistral, messages: list, on_delta: DeltaCallback,
+                             model: str, max_tokens: int) -> str:
+    """Потоковая генерация: отдаёт накопленный текст в on_delta по мере прихода токенов."""
+    response = await mistral.chat.stream_async(
+        model=model,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=TEMPERATURE,
     )
+    text = ""
+    async for event in response:
+        # Последнее событие потока содержит usage
+        _count_usage(getattr(event.data, "usage", None))
+        if not event.data.choices:
+            continue
+        delta = event.data.choices[0].delta.content
+        if isinstance(delta, str) and delta:
+            text += delta
+            await on_delta(text)
+    return text
+
+async def _complete_once(messages: list, model: str, max_tokens: int,
+                         on_delta: DeltaCallback | None) -> str:
+    """Одна попытка: слот планировщика → пауза между стартами → запрос."""
+    with track("llm_wait"):
+        await limiter.acquire()
     try:
-        async with Mistral(api_key=API_KEY) as mistral:
+        mistral = mistral_client()
+        await _wait_for_slot()
+        LLM_REQUESTS.inc(model=model)
+        with track("llm"):
+            if on_delta is not None:
+                return await _stream_completion(mistral, messages, on_delta, model, max_tokens)
             response = await mistral.chat.complete_async(
-                model="mistral-large-latest",
+                model=model,
                 messages=messages,
-                max_tokens=max_response_tokens,
+                max_tokens=max_tokens,
                 stream=False,
-                temperature=temperature,
+                temperature=TEMPERATURE,
             )
-            
-            assistant_response = response.choices[0].message.content
+            _count_usage(response.usage)
+            return response.choices[0].message.content
+    finally:
+        limiter.release()
+
+# Используем асинхронный клиент
+async def get_long_completion(user_prompt: str, on_delta: DeltaCallback | None = None) -> str:
+    """
+    Асинхронно генерирует максимально длинный ответ от Mistral AI с учётом системного промта.
+
+    Модель и max_tokens выбираются по размеру запроса; 429, 5xx и сетевые ошибки повторяются
+    с экспоненциальной паузой (до MISTRAL_MAX_RETRIES раз).
+
+    :param user_prompt: Запрос от пользователя (обычно содержимое кода для ревью).
+    :param on_delta: Если задан — ответ запрашивается потоково, и колбэк получает накопленный текст.
+    :return: Текст технического ревью от модели.
+    """
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+    prompt_tokens = estimate_tokens(SYSTEM_PROMPT + user_prompt)
+    model = choose_model(prompt_tokens)
+    max_tokens = response_budget(prompt_tokens)
 
+    logger.info(
+            f"✅ Отправлен запрос в ИИ ({model}, ~{prompt_tokens} токенов, max_tokens={max_tokens}). "
+    )
+    for attempt in range(MISTRAL_MAX_RETRIES + 1):
+        try:
+            assistant_response = await _complete_once(messages, model, max_tokens, on_delta)
             logger.info(
                 f"✅ Получен ответ ИИ (длина: {len(assistant_response)}). "
                 f"Превью: {assistant_response[:150]}..."
             )
-  
             return assistant_response
-        
-    except Exception as e:
-        logger.error(f"Ошибка при вызове Mistral API: {e}")
-        raise
\ No newline at end of file
+
+        except Exception as e:
+            if attempt == MISTRAL_MAX_RETRIES or not is_retryable(e):
+                logger.error(f"Ошибка при вызове Mistral API: {e}")
+                raise
+            delay = backoff_delay(attempt)
+            LLM_RETRIES.inc(reason=str(getattr(e, "status_code", None) or type(e).__name__))
+            logger.warning(f"🔁 Mistral: {e}; повтор {attempt + 1}/{MISTRAL_MAX_RETRIES} через {delay:.1f} с")
+            await asyncio.sleep(delay)
@@ -0,0 +1,52 @@
+# src/utils/rate_limit.py
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Ведро токенов: rate запросов в секунду с запасом burst; rate <= 0 — без ограничения.
+
+    pause() останавливает выдачу на заданное время (например, по retry_after от API)."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        # Ожидающие получают токены строго по очереди
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self) -> float:
+        """Сколько секунд ждать следующего токена."""
+        now = time.monotonic()
+        self._refill(now)
+        wait = max(0.0, self._paused_until - now)
+        if self.rate > 0 and self._tokens < 1:
+            wait = max(wait, (1 - self._tokens) / self.rate)
+        return wait
+
+    def ready(self) -> bool:
+        """Токен можно взять прямо сейчас, никого не обгоняя."""
+        return not self._lock.locked() and self.delay() == 0
+
+    def take(self) -> None:
+        if self.rate > 0:
+            self._tokens -= 1
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            wait = self.delay()
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self.delay()
+            self.take()
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
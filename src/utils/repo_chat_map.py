@@ -1,68 +1,172 @@
 # src/utils/repo_chat_mapping.py
 
 import json
+import os
+import sqlite3
+import tempfile
+import threading
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Any, Optional, Dict
 from loguru import logger
 
 # Путь к JSON-файлу относительно этого файла (utils/)
-_DATA_FILE = Path(__file__).parent.parent / "json" / "mappings.json"
+_DATA_FILE = Path(os.getenv("REPO_MAP_FILE", Path(__file__).parent.parent / "json" / "mappings.json"))
+_DB_FILE = _DATA_FILE.with_suffix(".sqlite3")
+# Хранилище маппингов: "json" (по умолчанию) или "sqlite"
+REPO_MAP_BACKEND = os.getenv("REPO_MAP_BACKEND", "json")
 
 # Создаём директорию json/ при импорте, если её нет
 _DATA_FILE.parent.mkdir(parents=True, exist_ok=True)
 logger.debug(f"📁 Папка для маппингов убедительно создана: {_DATA_FILE.parent}")
 
-def _load_data() -> Dict[str, Dict[str, int]]:
-    """Загружает данные из json/mappings.json """
-    if not _DATA_FILE.exists():
-        logger.debug(f"📂 Файл {_DATA_FILE} не найден — возвращаем пустой словарь")
-        return {}
-
-    try:
-        with open(_DATA_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            logger.debug(f"✅ Загружено {len(data)} записей из {_DATA_FILE}")
-            return data
-    except json.JSONDecodeError as e:
-        logger.error(f"❌ Ошибка парсинга JSON в {_DATA_FILE}: {e}")
-        return {}
-    except Exception as e:
-        logger.exception(f"💥 Неожиданная ошибка при загрузке {_DATA_FILE}: {e}")
-        return {}
-
-def _save_data(data: Dict[str, Dict[str, int]]) -> None:
-    """Сохраняет данные в json/mappings.json."""
-    try:
-        with open(_DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        logger.debug(f"💾 Сохранено {len(data)} записей в {_DATA_FILE}")
-    except Exception as e:
-        logger.exception(f"💥 Ошибка при сохранении в {_DATA_FILE}: {e}")
+_lock = threading.Lock()
+
+
+class _JsonStore:
+    """mappings.json, проиндексированный по repo_id; перечитывается только при смене mtime."""
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._data: Dict[str, Dict[str, Any]] = {}
+        self._index: Dict[int, Dict[str, Any]] = {}
+        # -1 — ещё ни разу не загружали (None означает «файла нет»)
+        self._mtime_ns: Optional[int] = -1
+
+    def _load_data(self) -> Dict[str, Dict[str, Any]]:
+        """Загружает данные из json/mappings.json """
+        if not self._path.exists():
+            logger.debug(f"📂 Файл {self._path} не найден — возвращаем пустой словарь")
+            return {}
+
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+                logger.debug(f"✅ Загружено {len(data)} записей из {self._path}")
+                return data
+        except json.JSONDecodeError as e:
+            logger.error(f"❌ Ошибка парсинга JSON в {self._path}: {e}")
+            return {}
+        except Exception as e:
+            logger.exception(f"💥 Неожиданная ошибка при загрузке {self._path}: {e}")
+            return {}
+
+    def _refresh(self) -> None:
+        """Перечитывает файл, если его mtime изменился с прошлой загрузки."""
+        try:
+            mtime_ns = self._path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        if mtime_ns == self._mtime_ns:
+            return
+        self._data = self._load_data()
+        self._index = {record["repo_id"]: record for record in self._data.values()}
+        self._mtime_ns = mtime_ns
+
+    def get(self, repo_id: int) -> Optional[Dict[str, Any]]:
+        with _lock:
+            self._refresh()
+            return self._index.get(repo_id)
+
+    def put(self, record: Dict[str, Any]) -> None:
+        """Сохраняет запись атомарно: запись во временный файл + rename."""
+        with _lock:
+            self._refresh()
+            data = dict(self._data)
+            key = f"id_{record['repo_id']}"
+            data[key] = {**data.get(key, {}), **record}
+            tmp_path = None
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=self._path.parent, prefix=".mappings-", suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=2, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self._path)
+                logger.debug(f"💾 Сохранено {len(data)} записей в {self._path}")
+            except Exception as e:
+                logger.exception(f"💥 Ошибка при сохранении в {self._path}: {e}")
+                if tmp_path:
+                    Path(tmp_path).unlink(missing_ok=True)
+                return
+            self._data = data
+            self._index = {r["repo_id"]: r for r in data.values()}
+            self._mtime_ns = self._path.stat().st_mtime_ns
+
+
+class _SqliteStore:
+    """Маппинги в SQLite: поиск по первичному ключу repo_id, конкурентные записи через транзакции."""
+
+    def __init__(self, path: Path, import_from: Path):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS mappings ("
+            " repo_id INTEGER PRIMARY KEY, chat_id INTEGER NOT NULL, settings TEXT NOT NULL DEFAULT '{}')"
+        )
+        if import_from.exists() and not self._conn.execute("SELECT 1 FROM mappings LIMIT 1").fetchone():
+            records = _JsonStore(import_from)._load_data().values()
+            for record in records:
+                self.put(record)
+            logger.info(f"📦 Импортировано {len(records)} записей из {import_from} в {path}")
+
+    def get(self, repo_id: int) -> Optional[Dict[str, Any]]:
+        with _lock:
+            row = self._conn.execute(
+                "SELECT chat_id, settings FROM mappings WHERE repo_id = ?", (repo_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {**json.loads(row[1]), "repo_id": repo_id, "chat_id": row[0]}
+
+    def put(self, record: Dict[str, Any]) -> None:
+        settings = {k: v for k, v in record.items() if k not in ("repo_id", "chat_id")}
+        with _lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT settings FROM mappings WHERE repo_id = ?", (record["repo_id"],)
+                ).fetchone()
+                merged = {**(json.loads(row[0]) if row else {}), **settings}
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO mappings (repo_id, chat_id, settings) VALUES (?, ?, ?)",
+                    (record["repo_id"], record["chat_id"], json.dumps(merged, ensure_ascii=False)),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+_store = _SqliteStore(_DB_FILE, _DATA_FILE) if REPO_MAP_BACKEND == "sqlite" else _JsonStore(_DATA_FILE)
+logger.debug(f"🗂️ Хранилище маппингов: {REPO_MAP_BACKEND}")
+
 
 def is_repo_id_registered(repo_id: int) -> bool:
     """Проверяет, зарегистрирован ли repo_id."""
-    registered = repo_id in [record["repo_id"] for record in _load_data().values()]
+    registered = _store.get(repo_id) is not None
     logger.debug(f"🔍 Проверка регистрации repo_id={repo_id}: {'✅ да' if registered else '❌ нет'}")
     return registered
 
 def get_chat_id(repo_id: int) -> Optional[int]:
     """Возвращает chat_id по repo_id или None."""
-    data = _load_data()
-    for record in data.values():
-        if record["repo_id"] == repo_id:
-            chat_id = record["chat_id"]
-            logger.debug(f"📩 Найден chat_id={chat_id} для repo_id={repo_id}")
-            return chat_id
-    logger.warning(f"⚠️ chat_id не найден для repo_id={repo_id}")
-    return None
+    record = _store.get(repo_id)
+    if record is None:
+        logger.warning(f"⚠️ chat_id не найден для repo_id={repo_id}")
+        return None
+    chat_id = record["chat_id"]
+    logger.debug(f"📩 Найден chat_id={chat_id} для repo_id={repo_id}")
+    return chat_id
+
+def get_repo_settings(repo_id: int) -> Dict[str, Any]:
+    """Возвращает дополнительные настройки репозитория (например, review_mode) или пустой словарь."""
+    record = _store.get(repo_id) or {}
+    return {k: v for k, v in record.items() if k not in ("repo_id", "chat_id")}
 
 def add_mapping(repo_id: int, chat_id: int) -> None:
     """Добавляет новую связку repo_id ↔ chat_id."""
-    data = _load_data()
-    new_key = f"id_{repo_id}"
-    if new_key in data:
-        logger.info(f"🔄 Обновление существующей записи: {new_key} → repo_id={repo_id}, chat_id={chat_id}")
+    if _store.get(repo_id) is not None:
+        logger.info(f"🔄 Обновление существующей записи: id_{repo_id} → repo_id={repo_id}, chat_id={chat_id}")
     else:
-        logger.info(f"🆕 Добавление новой записи: {new_key} → repo_id={repo_id}, chat_id={chat_id}")
-    data[new_key] = {"repo_id": repo_id, "chat_id": chat_id}
-    _save_data(data)
\ No newline at end of file
+        logger.info(f"🆕 Добавление новой записи: id_{repo_id} → repo_id={repo_id}, chat_id={chat_id}")
+    # Дополнительные настройки репозитория (review_mode и т.п.) при обновлении сохраняются
+    _store.put({"repo_id": repo_id, "chat_id": chat_id})
@@ -0,0 +1,234 @@
+# src/utils/repo_mirror.py
+
+import asyncio
+import base64
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from loguru import logger
+from src.utils.github_webhook import _decode_text
+from src.utils.metrics import STAGE_ERRORS, track
+
+# Локальные bare-зеркала репозиториев: файлы и диффы читаются из git, а не через REST API
+REPO_MIRROR_ENABLED = os.getenv("REPO_MIRROR_ENABLED", "0") == "1"
+REPO_MIRROR_DIR = Path(os.getenv("REPO_MIRROR_DIR", Path(__file__).parent.parent / "json" / "mirrors"))
+GITHUB_GIT_BASE = os.getenv("GITHUB_GIT_BASE", "https://github.com")
+REPO_MIRROR_TIMEOUT = float(os.getenv("REPO_MIRROR_TIMEOUT", "300"))
+
+_STATUSES = {"A": "added", "M": "modified", "D": "removed", "R": "renamed", "C": "copied", "T": "changed"}
+
+_locks: Dict[Path, asyncio.Lock] = {}
+
+
+class GitError(Exception):
+    """Команда git завершилась ошибкой или не уложилась в REPO_MIRROR_TIMEOUT."""
+
+
+def is_enabled() -> bool:
+    return REPO_MIRROR_ENABLED
+
+
+def _mirror_path(owner: str, repo: str) -> Path:
+    return REPO_MIRROR_DIR / owner / f"{repo}.git"
+
+
+def _auth_env(github_token: Optional[str]) -> Dict[str, str]:
+    """Токен передаётся заголовком через окружение git — не попадает ни в URL, ни в config, ни в ps."""
+    env = {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+    if github_token:
+        basic = base64.b64encode(f"x-access-token:{github_token}".encode()).decode()
+        env.update({"GIT_CONFIG_COUNT": "1", "GIT_CONFIG_KEY_0": "http.extraHeader",
+                    "GIT_CONFIG_VALUE_0": f"Authorization: Basic {basic}"})
+    return env
+
+
+async def _git(path: Path, *args: str, stdin: Optional[bytes] = None,
+               github_token: Optional[str] = None) -> bytes:
+    proc = await asyncio.create_subprocess_exec(
+        "git", *args, cwd=path,
+        stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        env=_auth_env(github_token),
+    )
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(stdin), REPO_MIRROR_TIMEOUT)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise GitError(f"git {args[0]}: таймаут {REPO_MIRROR_TIMEOUT} с")
+    if proc.returncode != 0:
+        raise GitError(f"git {args[0]}: {err.decode('utf-8', errors='replace').strip()}")
+    return out
+
+
+async def _has_commit(path: Path, sha: str) -> bool:
+    try:
+        await _git(path, "cat-file", "-e", f"{sha}^{{commit}}")
+        return True
+    except GitError:
+        return False
+
+
+async def _ensure_commits(owner: str, repo: str, shas: List[str], github_token: Optional[str]) -> Path:
+    """Создаёт зеркало при первом обращении и догружает только недостающие коммиты."""
+    path = _mirror_path(owner, repo)
+    lock = _locks.setdefault(path, asyncio.Lock())
+    async with lock:
+        if not (path / "HEAD").exists():
+            path.mkdir(parents=True, exist_ok=True)
+            await _git(path, "init", "--bare", "--quiet")
+            await _git(path, "remote", "add", "origin", f"{GITHUB_GIT_BASE}/{owner}/{repo}.git")
+            logger.info(f"🪞 Создано зеркало {owner}/{repo}: {path}")
+
+        missing = [sha for sha in shas if not await _has_commit(path, sha)]
+        if not missing:
+            return path
+        with track("mirror_fetch"):
+            # Ветки храним как refs — следующий fetch передаёт только новые объекты
+            await _git(path, "fetch", "--quiet", "--prune", "--no-tags", "origin",
+                       "+refs/heads/*:refs/heads/*", github_token=github_token)
+            missing = [sha for sha in missing if not await _has_commit(path, sha)]
+            # Коммиты, которых уже нет ни в одной ветке (force-push), — по SHA
+            if missing:
+                await _git(path, "fetch", "--quiet", "--no-tags", "origin",
+                           *(f"+{sha}:refs/review/{sha}" for sha in missing), github_token=github_token)
+        logger.debug(f"🪞 Зеркало {owner}/{repo} обновлено")
+    return path
+
+
+async def _read_blobs(path: Path, blob_shas: List[str]) -> Dict[str, str]:
+    """Все blob'ы одним процессом git cat-file --batch; вывод режется по memoryview, без копий всего буфера."""
+    request = "".join(f"{sha}\n" for sha in blob_shas).encode()
+    with track("mirror_read"):
+        out = await _git(path, "cat-file", "--batch", stdin=request)
+
+    view = memoryview(out)
+    blobs: Dict[str, str] = {}
+    pos = 0
+    for sha in blob_shas:
+        header_end = out.index(b"\n", pos)
+        header = bytes(view[pos:header_end]).split()
+        pos = header_end + 1
+        if len(header) < 3 or header[1] == b"missing":
+            blobs[sha] = "<ERROR: missing>"
+            continue
+        size = int(header[2])
+        blobs[sha] = _decode_text(view[pos:pos + size].tobytes())
+        pos += size + 1
+    return blobs
+
+
+async def _ls_tree(path: Path, commit_sha: str) -> tuple[Dict[str, str], Dict[str, int]]:
+    out = await _git(path, "ls-tree", "-r", "-l", "-z", commit_sha)
+    tree: Dict[str, str] = {}
+    sizes: Dict[str, int] = {}
+    for entry in out.decode("utf-8", errors="replace").split("\0"):
+        if not entry:
+            continue
+        meta, file_path = entry.split("\t", 1)
+        _, kind, sha, size = meta.split()
+        if kind == "blob":
+            tree[file_path] = sha
+            sizes[file_path] = int(size)
+    return tree, sizes
+
+
+async def fetch_commit_tree(owner: str, repo: str, commit_sha: str,
+                            github_token: str) -> tuple[Dict[str, str], Dict[str, int], str]:
+    """Дерево коммита из зеркала → ({path: blob_sha}, {path: size}, error_msg) """
+    try:
+        path = await _ensure_commits(owner, repo, [commit_sha], github_token)
+        tree, sizes = await _ls_tree(path, commit_sha)
+    except GitError as e:
+        STAGE_ERRORS.inc(stage="mirror")
+        return {}, {}, f"❌ Зеркало {owner}/{repo}: {e}"
+    return tree, sizes, ""
+
+
+async def fetch_files(owner: str, repo: str, commit_sha: str, file_paths: List[str],
+                      github_token: str, tree: Optional[Dict[str, str]] = None) -> tuple[Dict[str, str], str]:
+    """Содержимое файлов коммита из зеркала → ({path: content}, error_msg) """
+    try:
+        path = await _ensure_commits(owner, repo, [commit_sha], github_token)
+        if tree is None:
+            tree, _ = await _ls_tree(path, commit_sha)
+        blobs = await _read_blobs(path, sorted({tree[p] for p in file_paths if p in tree}))
+    except GitError as e:
+        STAGE_ERRORS.inc(stage="mirror")
+        return {}, f"❌ Зеркало {owner}/{repo}: {e}"
+    contents = {p: blobs[tree[p]] if p in tree else "<ERROR: not found>" for p in file_paths}
+    logger.success(f"✅ Из зеркала прочитано {len(contents)} файлов")
+    return contents, ""
+
+
+async def is_ancestor(owner: str, repo: str, ancestor_sha: str, sha: str, github_token: str) -> Optional[bool]:
+    """Входит ли ancestor_sha в историю sha (по merge-base); None — зеркало недоступно."""
+    try:
+        path = await _ensure_commits(owner, repo, [ancestor_sha, sha], github_token)
+        base = await _git(path, "merge-base", ancestor_sha, sha)
+    except GitError as e:
+        STAGE_ERRORS.inc(stage="mirror")
+        logger.warning(f"⚠️ Зеркало {owner}/{repo}: не удалось сравнить {ancestor_sha[:7]} и {sha[:7]}: {e}")
+        return None
+    return base.decode().strip() == ancestor_sha
+
+
+def _parse_name_status(out: bytes) -> List[Dict]:
+    """git diff --name-status -z → записи в формате файлов compare API."""
+    tokens = out.decode("utf-8", errors="replace").split("\0")
+    files: List[Dict] = []
+    i = 0
+    while i < len(tokens) and tokens[i]:
+        code = tokens[i][0]
+        entry = {"status": _STATUSES.get(code, "modified")}
+        if code in ("R", "C"):
+            entry.update(previous_filename=tokens[i + 1], filename=tokens[i + 2])
+            i += 3
+        else:
+            entry["filename"] = tokens[i + 1]
+            i += 2
+        files.append(entry)
+    return files
+
+
+def _split_patches(out: bytes) -> List[str]:
+    """Полный git diff → патчи по файлам (в порядке --name-status), только hunk'и, как у GitHub."""
+    text = out.decode("utf-8", errors="replace")
+    patches: List[str] = []
+    for section in text.split("\ndiff --git ") if text else []:
+        hunk = section.find("\n@@ ")
+        body = section[hunk + 1:] if hunk >= 0 else ""
+        patches.append(body.rstrip("\n"))
+    return patches
+
+
+async def fetch_diffs(owner: str, repo: str, before_sha: str, after_sha: str, github_token: str,
+                      context: int = 3, select: Optional[Callable[[List[Dict]], List[Dict]]] = None
+                      ) -> tuple[Dict[str, str], str]:
+    """Патчи между коммитами из зеркала → ({path: patch}, error_msg); контекст любой, без догрузки файлов."""
+    try:
+        path = await _ensure_commits(owner, repo, [before_sha, after_sha], github_token)
+        # Как compare API GitHub: изменения after относительно общего предка (base...head)
+        revisions = f"{before_sha}...{after_sha}"
+        with track("mirror_diff"):
+            names = await _git(path, "diff", "--no-color", "--no-ext-diff", "-M", "--name-status", "-z", revisions)
+            full = await _git(path, "diff", "--no-color", "--no-ext-diff", "-M", f"-U{context}", revisions)
+    except GitError as e:
+        STAGE_ERRORS.inc(stage="mirror")
+        return {}, f"❌ Зеркало {owner}/{repo} {before_sha[:7]}...{after_sha[:7]}: {e}"
+
+    files = _parse_name_status(names)
+    patches = _split_patches(full)
+    if len(patches) != len(files):
+        return {}, f"❌ Зеркало {owner}/{repo}: не удалось сопоставить диффы с файлами"
+    for entry, patch in zip(files, patches):
+        if patch:
+            entry["patch"] = patch
+            entry["changes"] = sum(1 for line in patch.splitlines() if line[:1] in ("+", "-"))
+
+    files = [f for f in files if f["status"] != "removed"]
+    if select is not None:
+        files = select(files)
+    diffs = {f["filename"]: f["patch"] for f in files if f.get("patch")}
+    logger.success(f"✅ Из зеркала получены диффы {len(diffs)} файлов ({sum(map(len, diffs.values()))} символов)")
+    return diffs, ""
@@ -0,0 +1,107 @@
+# src/utils/review_cache.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+from loguru import logger
+
+# SQLite-файл кэша лежит рядом с маппингами (json/)
+_DB_FILE = Path(os.getenv("REVIEW_CACHE_PATH", Path(__file__).parent.parent / "json" / "review_cache.sqlite3"))
+# Время жизни записи (секунды) и максимальное число записей; 0 — кэш выключен
+REVIEW_CACHE_TTL = int(os.getenv("REVIEW_CACHE_TTL", str(30 * 24 * 3600)))
+REVIEW_CACHE_MAX_ENTRIES = int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", "10000"))
+
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def _connect() -> sqlite3.Connection:
+    """Открывает (при первом обращении) соединение с базой кэша."""
+    global _conn
+    if _conn is None:
+        _DB_FILE.parent.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(_DB_FILE, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS reviews ("
+            " key TEXT PRIMARY KEY, review TEXT NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS reviews_accessed ON reviews (accessed_at)")
+        logger.debug(f"🗄️ Кэш ревью открыт: {_DB_FILE}")
+    return _conn
+
+
+def make_key(*parts: str) -> str:
+    """Ключ кэша: хеш от идентификатора содержимого (blob SHA, хеш патча) и версии промта."""
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+def is_enabled() -> bool:
+    return REVIEW_CACHE_MAX_ENTRIES > 0
+
+
+def get_cached_reviews(keys: Dict[str, str]) -> Dict[str, str]:
+    """{path: key} → {path: review} для найденных в кэше и не просроченных записей."""
+    if not is_enabled() or not keys:
+        return {}
+
+    now = time.time()
+    found: Dict[str, str] = {}
+    with _lock:
+        conn = _connect()
+        for path, key in keys.items():
+            row = conn.execute(
+                "SELECT review FROM reviews WHERE key = ? AND created_at >= ?",
+                (key, now - REVIEW_CACHE_TTL),
+            ).fetchone()
+            if row:
+                found[path] = row[0]
+                conn.execute("UPDATE reviews SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        _stats["hits"] += len(found)
+        _stats["misses"] += len(keys) - len(found)
+
+    logger.info(f"🗄️ Кэш ревью: {len(found)} попаданий из {len(keys)}")
+    return found
+
+
+def store_reviews(reviews: Dict[str, str]) -> None:
+    """Сохраняет {key: review} и вытесняет просроченные/самые старые записи."""
+    if not is_enabled() or not reviews:
+        return
+
+    now = time.time()
+    with _lock:
+        conn = _connect()
+        conn.executemany(
+            "INSERT OR REPLACE INTO reviews (key, review, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            [(key, review, now, now) for key, review in reviews.items()],
+        )
+        _stats["stores"] += len(reviews)
+        _evict(conn, now)
+        conn.commit()
+
+
+def _evict(conn: sqlite3.Connection, now: float) -> None:
+    """TTL + LRU по времени последнего обращения."""
+    expired = conn.execute("DELETE FROM reviews WHERE created_at < ?", (now - REVIEW_CACHE_TTL,)).rowcount
+    overflow = conn.execute(
+        "DELETE FROM reviews WHERE key IN ("
+        " SELECT key FROM reviews ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+        (REVIEW_CACHE_MAX_ENTRIES,),
+    ).rowcount
+    if expired or overflow:
+        _stats["evictions"] += expired + overflow
+        logger.debug(f"🧹 Кэш ревью: удалено просроченных={expired}, лишних={overflow}")
+
+
+def cache_stats() -> Dict[str, float]:
+    """Счётчики кэша с момента запуска процесса и доля попаданий."""
+    lookups = _stats["hits"] + _stats["misses"]
+    return {**_stats, "hit_ratio": round(_stats["hits"] / lookups, 4) if lookups else 0.0}
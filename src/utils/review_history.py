@@ -0,0 +1,93 @@
+# src/utils/review_history.py
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+from loguru import logger
+
+# История ревью: последний проверенный коммит ветки и краткое прошлое ревью каждого файла
+_DB_FILE = Path(os.getenv("REVIEW_HISTORY_PATH", Path(__file__).parent.parent / "json" / "review_history.sqlite3"))
+REVIEW_HISTORY_ENABLED = os.getenv("REVIEW_HISTORY_ENABLED", os.getenv("REPO_MIRROR_ENABLED", "0")) == "1"
+# Сколько символов прошлого ревью файла добавлять в промт
+REVIEW_HISTORY_MAX_CHARS = int(os.getenv("REVIEW_HISTORY_MAX_CHARS", "1500"))
+
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    """Открывает (при первом обращении) базу истории."""
+    global _conn
+    if _conn is None:
+        _DB_FILE.parent.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(_DB_FILE, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS refs ("
+            " repo_id INTEGER NOT NULL, ref TEXT NOT NULL, sha TEXT NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (repo_id, ref))"
+        )
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " repo_id INTEGER NOT NULL, path TEXT NOT NULL, sha TEXT NOT NULL, summary TEXT NOT NULL,"
+            " updated_at REAL NOT NULL, PRIMARY KEY (repo_id, path))"
+        )
+        logger.debug(f"🗄️ История ревью открыта: {_DB_FILE}")
+    return _conn
+
+
+def is_enabled() -> bool:
+    return REVIEW_HISTORY_ENABLED
+
+
+def summarize(review: str, limit: int = REVIEW_HISTORY_MAX_CHARS) -> str:
+    """Начало ревью по границе строки — дёшево и без отдельного запроса к ИИ."""
+    if len(review) <= limit:
+        return review
+    cut = review.rfind("\n", 0, limit)
+    return review[:cut if cut > 0 else limit].rstrip() + "\n…"
+
+
+def last_reviewed_sha(repo_id: int, ref: str) -> Optional[str]:
+    """Последний коммит ветки, ревью которого было завершено."""
+    if not is_enabled() or not ref:
+        return None
+    with _lock:
+        row = _connect().execute("SELECT sha FROM refs WHERE repo_id = ? AND ref = ?", (repo_id, ref)).fetchone()
+    return row[0] if row else None
+
+
+def get_summaries(repo_id: int, paths) -> Dict[str, Dict[str, str]]:
+    """{path: {"sha", "summary"}} прошлых ревью указанных файлов."""
+    if not is_enabled():
+        return {}
+    found: Dict[str, Dict[str, str]] = {}
+    with _lock:
+        conn = _connect()
+        for path in paths:
+            row = conn.execute("SELECT sha, summary FROM files WHERE repo_id = ? AND path = ?",
+                               (repo_id, path)).fetchone()
+            if row:
+                found[path] = {"sha": row[0], "summary": row[1]}
+    return found
+
+
+def record_review(repo_id: int, ref: str, sha: str, reviews: Dict[str, str]) -> None:
+    """Запоминает проверенный коммит ветки и краткие ревью файлов."""
+    if not is_enabled():
+        return
+    now = time.time()
+    with _lock:
+        conn = _connect()
+        if ref:
+            conn.execute("INSERT OR REPLACE INTO refs (repo_id, ref, sha, updated_at) VALUES (?, ?, ?, ?)",
+                         (repo_id, ref, sha, now))
+        conn.executemany(
+            "INSERT OR REPLACE INTO files (repo_id, path, sha, summary, updated_at) VALUES (?, ?, ?, ?, ?)",
+            [(repo_id, path, sha, summarize(review), now) for path, review in reviews.items()],
+        )
+        conn.commit()
+    logger.debug(f"🗄️ История ревью: {sha[:7]} ({ref}), файлов {len(reviews)}")
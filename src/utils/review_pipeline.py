@@ -0,0 +1,398 @@
+# src/utils/review_pipeline.py
+
+import asyncio
+import hashlib
+import html
+import json
+import os
+from typing import Any, Dict, Optional
+from loguru import logger
+from src.utils.github_webhook import fetch_commit_tree, fetch_files, file_block
+from src.utils.github_diff import REVIEW_DIFF_CONTEXT, changed_ranges, diff_block, fetch_diffs, is_diffable
+from src.utils.mistral_client import DeltaCallback, get_long_completion, prompt_fingerprint
+from src.utils.chat_notifier import markdown_to_html, notify_telegram_review, send_code_review, start_live_review
+from src.utils.repo_chat_map import get_chat_id, get_repo_settings
+from src.utils.review_cache import get_cached_reviews, make_key, store_reviews
+from src.utils.metrics import track
+from src.utils import job_store, repo_mirror, review_history
+from src.utils.chunking import REVIEW_CHUNK_TOKENS, Chunk, build_chunks, estimate_tokens, split_review_by_file
+from src.utils.file_filter import BINARY_MARKER, apply_budget, filter_paths, summarize_skipped
+from src.utils.static_analysis import (CLEAN_REVIEW, STATIC_ANALYSIS_ENABLED, analyze_files, analyzer_for,
+                                       format_findings, is_trivial, touching_lines)
+from src.utils.static_analysis import fingerprint as rules_fingerprint
+
+GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+# Режим ревью по умолчанию: "diff" — только изменения, "full" — файлы целиком.
+# Переопределяется полем review_mode в записи репозитория в json/mappings.json
+REVIEW_MODE = os.getenv("REVIEW_MODE", "diff")
+# Потоковый вывод итогового ревью в Telegram по мере генерации
+REVIEW_STREAMING = os.getenv("REVIEW_STREAMING", "1") == "1"
+
+_PROMPTS = {
+    "full": "Проанализируй следующий код:\n\n{code}",
+    "diff": ("Проанализируй следующие изменения (unified diff: строки с '+' добавлены, "
+             "с '-' удалены, остальные — контекст):\n\n{code}"),
+}
+_MULTI_FILE_HINT = ("\n\nДля каждого файла начни отдельный раздел строкой «### FILE: <путь>» "
+                    "с путём точно как в заголовке файла.")
+_FINDINGS_HINT = ("\n\nТочные результаты статического анализа (длина функций, вложенность, выходы, global) — "
+                  "не пересчитывай их, а используй в обзоре:\n{findings}")
+_HISTORY_HINT = ("\n\nПрошлое ревью файла {path} — не повторяй актуальные замечания дословно, "
+                 "отметь, что исправлено:\n{summary}")
+_PART_HINT = "Это часть {part} из {parts} файла {path}; оценивай только этот фрагмент.\n"
+# Примерный размер строки diff — для файлов, которые compare API отдал без patch
+_LINE_BYTES = 80
+_REDUCE_PROMPT = ("Ниже — ревью отдельных файлов одного push. Объедини их в один короткий технический "
+                  "обзор для программиста, сохранив конкретные замечания с указанием файлов:\n\n{reviews}")
+
+# (repo_id, ref) → замок: задачи одной ветки выполняются по очереди
+_ref_locks: Dict[tuple, asyncio.Lock] = {}
+
+
+def _cache_keys(mode: str, content_ids: Dict[str, str]) -> Dict[str, str]:
+    """{path: blob SHA / хеш патча} → {path: ключ кэша} с учётом версии промта."""
+    fingerprint = prompt_fingerprint()
+    rules = rules_fingerprint()
+    return {path: make_key(mode, content_id, fingerprint, _PROMPTS[mode], rules)
+            for path, content_id in content_ids.items()}
+
+
+def _select_compare_files(settings: Dict[str, Any], skipped: Dict[str, str], selected: list):
+    """Отбор файлов compare по шаблонам и бюджету; самые изменённые файлы идут первыми."""
+    def select(files: list) -> list:
+        by_path = {f["filename"]: f for f in files}
+        kept, rejected = filter_paths(by_path, settings)
+        skipped.update(rejected)
+        sizes = {path: len(by_path[path].get("patch") or "") or by_path[path].get("changes", 0) * _LINE_BYTES
+                 for path in kept}
+        kept, rejected = apply_budget(sizes, {path: by_path[path].get("changes", 0) for path in kept})
+        skipped.update(rejected)
+        selected.extend(kept)
+        return [by_path[path] for path in kept]
+    return select
+
+
+async def _fetch_diffs(owner: str, repo_name: str, base: str, head: str, select) -> tuple[Dict[str, str], str]:
+    """Диффы из локального зеркала, если оно включено, иначе (или при ошибке зеркала) — через compare API."""
+    if repo_mirror.is_enabled():
+        diffs, error = await repo_mirror.fetch_diffs(owner, repo_name, base, head, GITHUB_TOKEN,
+                                                     REVIEW_DIFF_CONTEXT, select=select)
+        if not error:
+            return diffs, error
+        logger.warning(f"{error} — берём диффы из GitHub API")
+    return await fetch_diffs(owner, repo_name, base, head, GITHUB_TOKEN, select=select)
+
+
+async def _fetch_tree(owner: str, repo_name: str, sha: str) -> tuple[Dict[str, str], Dict[str, int], str]:
+    if repo_mirror.is_enabled():
+        tree, sizes, error = await repo_mirror.fetch_commit_tree(owner, repo_name, sha, GITHUB_TOKEN)
+        if not error:
+            return tree, sizes, error
+        logger.warning(f"{error} — берём дерево из GitHub API")
+    return await fetch_commit_tree(owner, repo_name, sha, GITHUB_TOKEN)
+
+
+async def _fetch_files(owner: str, repo_name: str, sha: str, paths: list,
+                       tree: Dict[str, str]) -> tuple[Dict[str, str], str]:
+    if repo_mirror.is_enabled():
+        contents, error = await repo_mirror.fetch_files(owner, repo_name, sha, paths, GITHUB_TOKEN, tree=tree)
+        if not error:
+            return contents, error
+        logger.warning(f"{error} — качаем файлы из GitHub API")
+    return await fetch_files(owner, repo_name, sha, paths, GITHUB_TOKEN, tree=tree)
+
+
+async def _diff_sources(owner: str, repo_name: str, data_result: Dict[str, Any], base: str,
+                        settings: Dict[str, Any], skipped: Dict[str, str]) -> Optional[tuple[Dict, Dict, Dict, Dict]]:
+    """Режим diff (base...sha) → (keys, cached, {path: patch}, findings) или None, если диффы получить не удалось."""
+    selected: list = []
+    diffs, error = await _fetch_diffs(owner, repo_name, base, data_result["sha"],
+                                      _select_compare_files(settings, skipped, selected))
+    if error:
+        return None
+    # Бинарные и слишком большие для GitHub файлы приходят без patch
+    skipped.update({path: "binary" for path in selected if path not in diffs})
+
+    findings = await _analyze_changed(owner, repo_name, data_result["sha"], diffs)
+    # Нарушения попадают в промт, поэтому входят в ключ кэша вместе с патчем
+    keys = _cache_keys("diff", {
+        path: hashlib.sha256((patch + json.dumps(findings.get(path), ensure_ascii=False)).encode("utf-8")).hexdigest()
+        for path, patch in diffs.items()
+    })
+    cached = get_cached_reviews(keys)
+    patches = {path: patch for path, patch in diffs.items() if path not in cached}
+    return keys, cached, patches, findings
+
+
+async def _full_sources(owner: str, repo_name: str, data_result: Dict[str, Any],
+                        settings: Dict[str, Any], skipped: Dict[str, str]) -> tuple[Dict, Dict, Dict]:
+    """Режим full → (keys, cached, {path: source}); из GitHub качаются только промахи кэша."""
+    tree, sizes, error = await _fetch_tree(owner, repo_name, data_result["sha"])
+    if error:
+        raise RuntimeError(error)
+
+    paths, rejected = filter_paths(data_result["file_paths"], settings)
+    skipped.update(rejected)
+    # Объём изменений в режиме full неизвестен — в бюджет первыми берём файлы поменьше
+    sizes = {path: sizes.get(path, 0) for path in paths}
+    paths, rejected = apply_budget(sizes, {path: -size for path, size in sizes.items()})
+    skipped.update(rejected)
+    keys = _cache_keys("full", {path: tree[path] for path in paths if path in tree})
+    cached = get_cached_reviews(keys)
+    misses = [path for path in paths if path not in cached]
+
+    contents: Dict[str, str] = {}
+    if misses:
+        contents, error = await _fetch_files(owner, repo_name, data_result["sha"], misses, tree)
+        if error:
+            raise RuntimeError(error)
+    # Файлы, которые не удалось скачать, не кэшируем
+    for path, content in contents.items():
+        if content.startswith("<ERROR"):
+            keys.pop(path, None)
+        elif content == BINARY_MARKER:
+            keys.pop(path, None)
+            skipped[path] = "binary"
+    sources = {path: contents[path] for path in misses if path not in skipped}
+    return keys, cached, sources
+
+
+async def _analyze_changed(owner: str, repo_name: str, sha: str, patches: Dict[str, str]) -> Dict[str, list]:
+    """Режим diff: статический анализ изменённых файлов в их версии после push → нарушения в изменённых строках.
+
+    Файлы целиком читаются только из локального зеркала — через API это вернуло бы загрузку каждого файла.
+    Результат только уточняет промт — без ИИ в режиме diff файлы не остаются."""
+    paths = [path for path in patches if analyzer_for(path) is not None]
+    if not STATIC_ANALYSIS_ENABLED or not repo_mirror.is_enabled() or not paths:
+        return {}
+    contents, error = await repo_mirror.fetch_files(owner, repo_name, sha, paths, GITHUB_TOKEN)
+    if error:
+        logger.warning(f"{error} — статический анализ изменённых файлов пропущен")
+        return {}
+    findings = await analyze_files({path: content for path, content in contents.items()
+                                    if not content.startswith("<ERROR") and content != BINARY_MARKER})
+    # Модель видит только hunk'и — нарушения в функциях вне них ей не проверить
+    return {path: touching_lines(items, changed_ranges(patches[path])) for path, items in findings.items()}
+
+
+async def _review_chunk(chunk: Chunk, sources: Dict[str, Any],
+                        on_delta: Optional[DeltaCallback] = None) -> Dict[str, str]:
+    """Map: один запрос к ИИ → {path: review} (или {"a, b": review}, если ответ не разбился по файлам)."""
+    prompt = _PROMPTS[sources["mode"]].format(code=chunk.text)
+    if chunk.parts > 1:
+        prompt = _PART_HINT.format(part=chunk.part, parts=chunk.parts, path=chunk.paths[0]) + prompt
+    findings = sources.get("findings") or {}
+    chunk_findings = {path: findings[path] for path in chunk.paths if path in findings}
+    if chunk_findings:
+        prompt += _FINDINGS_HINT.format(findings=format_findings(chunk_findings))
+    history = sources.get("history") or {}
+    for path in chunk.paths:
+        if path in history:
+            prompt += _HISTORY_HINT.format(path=path, summary=history[path])
+    if len(chunk.paths) > 1:
+        prompt += _MULTI_FILE_HINT
+
+    review = await get_long_completion(prompt, on_delta=on_delta)
+    if len(chunk.paths) == 1:
+        return {chunk.paths[0]: review}
+    return split_review_by_file(review, chunk.paths)
+
+
+async def _review_texts(sources: Dict[str, Any],
+                        on_delta: Optional[DeltaCallback] = None) -> tuple[Dict[str, str], int]:
+    """Ревью файлов пачками в пределах бюджета токенов, все пачки — параллельно → (reviews, число пачек)."""
+    chunks = build_chunks(sources["texts"])
+    # Потоково показываем только единственную пачку — иначе итог даст reduce
+    stream_to = on_delta if len(chunks) == 1 else None
+    results = await asyncio.gather(*(_review_chunk(chunk, sources, stream_to) for chunk in chunks))
+
+    # Части одного большого файла склеиваем по порядку
+    parts: Dict[str, list] = {}
+    for chunk, result in zip(chunks, results):
+        for path, review in result.items():
+            label = f"Часть {chunk.part}/{chunk.parts}:\n" if chunk.parts > 1 else ""
+            parts.setdefault(path, []).append(label + review)
+    return {path: "\n\n".join(items) for path, items in parts.items()}, len(chunks)
+
+
+def _format_report(reviews: Dict[str, str], cached: Dict[str, str]) -> str:
+    """Склеивает ревью файлов в одно HTML-сообщение; markdown ответов модели переводится в HTML."""
+    if not reviews:
+        return "📭 Нет изменений для ревью"
+    if len(reviews) == 1:
+        return markdown_to_html(next(iter(reviews.values())))
+    return "\n\n".join(
+        f"📄 <b>{html.escape(path)}</b>{' (из кэша)' if path in cached else ''}\n{markdown_to_html(reviews[path])}"
+        for path in sorted(reviews)
+    )
+
+
+async def _reduce_reviews(reviews: Dict[str, str], cached: Dict[str, str], chunks: int, fresh: int,
+                          on_delta: Optional[DeltaCallback] = None) -> str:
+    """Reduce: сводит ревью нескольких пачек (или свежее ревью с кэшированными) в один отчёт.
+
+    chunks — сколько пачек сгенерировала модель, fresh — сколько файлов в них было;
+    если сводка не нужна или невозможна — склеивает как есть."""
+    merged = _format_report(reviews, cached)
+    # Ответ единственной пачки уже цельный (и показан потоково), а готовые ревью сводить незачем
+    if chunks == 0 or (chunks == 1 and len(reviews) <= fresh):
+        return merged
+    if estimate_tokens(merged) > REVIEW_CHUNK_TOKENS:
+        logger.warning("📚 Ревью файлов слишком много для сводки — отправляем по файлам")
+        return merged
+    # Модели — исходный текст ревью, без HTML-разметки отчёта
+    raw = "\n\n".join(f"### {path}\n{reviews[path]}" for path in sorted(reviews))
+    try:
+        return markdown_to_html(await get_long_completion(_REDUCE_PROMPT.format(reviews=raw), on_delta=on_delta))
+    except Exception as e:
+        logger.error(f"❌ Не удалось свести ревью в один отчёт: {e}")
+        return merged
+
+
+async def _collect_sources(data_result: Dict[str, Any], mode: str, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Загружает изменения в нужном режиме →
+    {"mode", "keys", "cached", "texts", "skipped", "findings", "static", "history"}."""
+    owner, repo_name = data_result["repo"].split("/", 1)
+    repo_id = data_result["repo_id"]
+
+    # С историей ревью сравниваем с последним проверенным коммитом ветки: так в ревью попадут
+    # и push'и, ревью которых не состоялось
+    base = data_result.get("before", "")
+    last = review_history.last_reviewed_sha(repo_id, data_result.get("ref", ""))
+    if last and last not in (base, data_result["sha"]):
+        logger.info(f"📌 Ревью изменений с последнего проверенного коммита {last[:7]}")
+        base = last
+
+    diff = None
+    skipped: Dict[str, str] = {}
+    if mode == "diff" and is_diffable(base):
+        diff = await _diff_sources(owner, repo_name, data_result, base, settings, skipped)
+        if diff is None:
+            logger.warning("⚠️ Не удалось получить диффы — переходим в режим full")
+
+    # Правила структурного программирования проверяются по AST целого файла; в режиме diff —
+    # по версии файла после push, ещё до поиска в кэше
+    static: Dict[str, str] = {}
+    if diff is not None:
+        keys, cached, bodies, findings = diff
+    else:
+        mode = "full"
+        skipped.clear()
+        keys, cached, bodies = await _full_sources(owner, repo_name, data_result, settings, skipped)
+        findings = await analyze_files(bodies)
+        static = {path: CLEAN_REVIEW for path, body in bodies.items()
+                  if path in findings and is_trivial(body, findings[path])}
+    block = diff_block if mode == "diff" else file_block
+    texts = {path: block(path, body) for path, body in bodies.items() if path not in static}
+    # Прошлые ревью файлов — чтобы модель не повторялась и видела, что исправлено
+    history = {path: item["summary"] for path, item in review_history.get_summaries(repo_id, texts).items()
+               if item["sha"] != data_result["sha"]}
+    logger.info(f"🧮 Режим {mode}: из кэша {len(cached)}, без ИИ {len(static)}, на ревью {len(texts)} файлов, "
+                f"пропущено {len(skipped)}, с историей {len(history)}")
+    return {"mode": mode, "keys": keys, "cached": cached, "texts": texts, "skipped": skipped,
+            "findings": findings, "static": static, "history": history}
+
+
+async def _collect_reviews(sources: Dict[str, Any],
+                           on_delta: Optional[DeltaCallback] = None) -> tuple[Dict[str, str], Dict[str, str], int]:
+    """Ревьюит всё, чего нет в кэше → (reviews, cached, число сгенерированных пачек)."""
+    keys, cached = sources["keys"], sources["cached"]
+    fresh, chunks = await _review_texts(sources, on_delta)
+    fresh.update(sources.get("static", {}))
+    store_reviews({keys[path]: review for path, review in fresh.items() if path in keys})
+    return {**cached, **fresh}, cached, chunks
+
+
+async def run_review(data_result: Dict[str, Any]) -> None:
+    """Полный цикл ревью одного push: уведомление → загрузка файлов → ИИ → отправка результата.
+
+    Push'и одной ветки ревьюятся по очереди: следующий начинается с коммита, проверенного предыдущим."""
+    key = (data_result["repo_id"], data_result.get("ref", ""))
+    async with _ref_locks.setdefault(key, asyncio.Lock()):
+        with track("review"):
+            await _run_review(data_result)
+
+
+async def _is_newer_than_history(data_result: Dict[str, Any]) -> bool:
+    """Можно ли записать ревью push'а в историю как последнее для ветки.
+
+    Нельзя, если записанный коммит уже содержит этот (задача завершилась позже более новой):
+    ветка и ревью файлов откатились бы назад. После force-push истории расходятся — запись обновляется.
+    Без зеркала порядок обеспечивает очередь ветки."""
+    last = review_history.last_reviewed_sha(data_result["repo_id"], data_result.get("ref", ""))
+    if not last or last == data_result["sha"] or not repo_mirror.is_enabled():
+        return True
+    owner, repo_name = data_result["repo"].split("/", 1)
+    stale = await repo_mirror.is_ancestor(owner, repo_name, data_result["sha"], last, GITHUB_TOKEN)
+    if stale:
+        logger.info(f"📌 {data_result['sha'][:7]} старше проверенного {last[:7]} — историю не обновляем")
+    return not stale
+
+
+async def _run_review(data_result: Dict[str, Any]) -> None:
+    """Каждый этап фиксируется в job_store, поэтому после перезапуска задача продолжается с места остановки."""
+    job_id = data_result.get("job_id", "")
+    artifacts = (job_store.get_job(job_id) or {}).get("artifacts", {})
+    repo_id = data_result["repo_id"]
+    chat_id = get_chat_id(repo_id)
+    settings = get_repo_settings(repo_id)
+    mode = settings.get("review_mode", REVIEW_MODE)
+
+    if not artifacts.get("notified"):
+        message_id = await notify_telegram_review(
+            chat_id,
+            repo_name=data_result["repo"],
+            commit_id=data_result["commit"],
+            files_count=data_result["files"]
+        )
+        if message_id:
+            logger.success("📱 Telegram уведомление отправлено!")
+        # Уведомление о запуске потом превращается в ревью — в чат уходит одно сообщение на push
+        artifacts["live_message_id"] = message_id
+        job_store.advance_job(job_id, "notified", notified=True, live_message_id=message_id)
+
+    sources = job_store.load_content(job_id, "sources")
+    if sources is None:
+        sources = await _collect_sources(data_result, mode, settings)
+        job_store.save_content(job_id, "sources", sources)
+        job_store.advance_job(job_id, "fetched")
+    else:
+        logger.info(f"♻️ Задача {job_id}: изменения уже загружены — пропускаем GitHub")
+
+    # Возобновлённая задача дописывает уже созданное сообщение, а не публикует новое
+    header = f"📂 {data_result['repo']} · {data_result['commit']}\n\n"
+    live = start_live_review(
+        chat_id,
+        message_id=artifacts.get("live_message_id"),
+        on_created=lambda message_id: job_store.advance_job(job_id, "fetched", live_message_id=message_id),
+        header=header,
+    ) if REVIEW_STREAMING else None
+    on_delta = live.update if live else None
+
+    report = job_store.load_content(job_id, "report")
+    if report is None:
+        reviews, cached, chunks = await _collect_reviews(sources, on_delta)
+        if await _is_newer_than_history(data_result):
+            review_history.record_review(repo_id, data_result.get("ref", ""), data_result["sha"],
+                                         {path: review for path, review in reviews.items() if path in sources["keys"]})
+        report = await _reduce_reviews(reviews, cached, chunks, len(sources["texts"]), on_delta)
+        summary = summarize_skipped(sources.get("skipped", {}))
+        if summary:
+            report += "\n\n" + html.escape(summary)
+        job_store.save_content(job_id, "report", report)
+        job_store.advance_job(job_id, "reviewed")
+
+    # Отправляем результат; после перезапуска уже отправленные части не повторяются
+    sent = artifacts.get("delivered_parts", 0)
+
+    def on_sent(parts: int) -> None:
+        job_store.advance_job(job_id, "reviewed", delivered_parts=parts)
+
+    if artifacts.get("delivered"):
+        logger.info(f"♻️ Задача {job_id}: ревью уже доставлено")
+    elif live:
+        await live.finish(report, sent, on_sent)
+    else:
+        await send_code_review(report, chat_id, message_id=artifacts.get("live_message_id"), header=header,
+                               sent=sent, on_sent=on_sent)
+    job_store.advance_job(job_id, "delivered", delivered=True)
@@ -0,0 +1,175 @@
+# src/utils/review_queue.py
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from loguru import logger
+from src.utils.metrics import STAGE_LATENCY
+from src.utils import job_store
+
+# Размер пула воркеров и максимальная глубина очереди (backpressure)
+REVIEW_WORKERS = int(os.getenv("REVIEW_WORKERS", "2"))
+REVIEW_QUEUE_MAX_DEPTH = int(os.getenv("REVIEW_QUEUE_MAX_DEPTH", "100"))
+# Сколько завершённых задач храним для эндпоинта статуса
+REVIEW_JOB_HISTORY = int(os.getenv("REVIEW_JOB_HISTORY", "1000"))
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class QueueFullError(Exception):
+    """Очередь ревью переполнена — новую задачу принять нельзя."""
+
+
+@dataclass
+class ReviewJob:
+    """Задача на ревью одного push-события."""
+    id: str
+    payload: Dict[str, Any]
+    status: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Публичное представление задачи (без содержимого payload)."""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "repo": self.payload.get("repo"),
+            "commit": self.payload.get("commit"),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+class ReviewQueue:
+    """Очередь ревью с ограниченным пулом воркеров."""
+
+    def __init__(self, handler: JobHandler, workers: int = REVIEW_WORKERS,
+                 max_depth: int = REVIEW_QUEUE_MAX_DEPTH, history: int = REVIEW_JOB_HISTORY):
+        self._handler = handler
+        self._workers_count = max(1, workers)
+        self._max_depth = max_depth
+        self._history = history
+        self._queue: Optional[asyncio.Queue] = None
+        self._jobs: "OrderedDict[str, ReviewJob]" = OrderedDict()
+        self._workers: List[asyncio.Task] = []
+        # Задачи, ждущие места в переполненной очереди; ссылки держим, чтобы их не собрал GC
+        self._waiting_puts: Set[asyncio.Task] = set()
+
+    @property
+    def depth(self) -> int:
+        """Текущее количество задач, ожидающих воркера."""
+        return self._queue.qsize() if self._queue else 0
+
+    def has_room(self, count: int = 1) -> bool:
+        """Поместятся ли в очередь ещё count задач."""
+        return self._max_depth <= 0 or self.depth + count <= self._max_depth
+
+    async def start(self) -> None:
+        """Запускает воркеры (вызывается из lifespan приложения) и возобновляет прерванные задачи."""
+        self._queue = asyncio.Queue(maxsize=self._max_depth)
+        self._recover()
+        self._workers = [
+            asyncio.create_task(self._worker(n), name=f"review-worker-{n}")
+            for n in range(self._workers_count)
+        ]
+        logger.info(f"🧵 Очередь ревью запущена: воркеров={self._workers_count}, глубина={self._max_depth}")
+
+    def _recover(self) -> None:
+        """Ставит в очередь задачи, не завершённые до остановки процесса."""
+        job_store.prune_jobs()
+        recovered = job_store.unfinished_jobs()
+        for stored in recovered:
+            job = ReviewJob(id=stored["id"], payload=stored["payload"], created_at=stored["created_at"])
+            self._jobs[job.id] = job
+            if self._queue.full():
+                # Лишние ждут места в очереди, не вытесняя новые webhook'и из лимита глубины надолго
+                self._put_later(job)
+            else:
+                self._queue.put_nowait(job)
+        if recovered:
+            logger.warning(f"♻️ Возобновлено {len(recovered)} прерванных задач ревью")
+
+    async def stop(self) -> None:
+        """Останавливает воркеры; прерванные задачи остаются в хранилище и возобновятся при старте."""
+        tasks = self._workers + list(self._waiting_puts)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        logger.info("🛑 Очередь ревью остановлена")
+
+    def submit(self, payload: Dict[str, Any], job_id: Optional[str] = None, reserved: bool = False) -> ReviewJob:
+        """Ставит задачу в очередь, не дожидаясь её выполнения.
+
+        reserved — место под задачу учтено заранее (push уже принят): при переполнении она ждёт, а не отклоняется."""
+        if self._queue is None:
+            raise RuntimeError("Очередь ревью не запущена")
+        job_id = job_id or uuid.uuid4().hex
+        job = ReviewJob(id=job_id, payload={**payload, "job_id": job_id})
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            if not reserved:
+                logger.warning(f"🚧 Очередь ревью переполнена ({self._max_depth}) — задача отклонена")
+                raise QueueFullError(f"Очередь ревью переполнена ({self._max_depth})")
+            logger.warning(f"🚧 Очередь ревью переполнена — задача {job_id} ждёт места")
+            self._put_later(job)
+        job_store.create_job(job.id, job.payload)
+        self._jobs[job.id] = job
+        self._prune_history()
+        logger.info(f"📥 Задача {job.id} поставлена в очередь (глубина: {self.depth})")
+        return job
+
+    def _put_later(self, job: ReviewJob) -> None:
+        """Ставит задачу в очередь, как только в ней освободится место."""
+        task = asyncio.create_task(self._queue.put(job))
+        self._waiting_puts.add(task)
+        task.add_done_callback(self._waiting_puts.discard)
+
+    def get(self, job_id: str) -> Optional[ReviewJob]:
+        """Возвращает задачу по ID или None."""
+        return self._jobs.get(job_id)
+
+    def _prune_history(self) -> None:
+        """Удаляет самые старые завершённые задачи сверх лимита истории."""
+        while len(self._jobs) > self._history:
+            oldest = next(iter(self._jobs.values()))
+            if oldest.status not in ("done", "failed"):
+                break
+            self._jobs.popitem(last=False)
+
+    async def _worker(self, n: int) -> None:
+        """Бесконечный цикл воркера: берёт задачу и выполняет обработчик."""
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            STAGE_LATENCY.observe(job.started_at - job.created_at, stage="queue_wait")
+            logger.info(f"⚙️ Воркер {n} взял задачу {job.id}")
+            try:
+                await self._handler(job.payload)
+                job.status = "done"
+                job_store.finish_job(job.id, "done")
+                logger.success(f"✅ Задача {job.id} выполнена")
+            except asyncio.CancelledError:
+                # В хранилище задача остаётся незавершённой и будет возобновлена
+                job.status = "failed"
+                job.error = "cancelled"
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                job_store.finish_job(job.id, "failed", str(e))
+                logger.exception(f"💥 Задача {job.id} завершилась с ошибкой")
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
@@ -0,0 +1,249 @@
+# src/utils/static_analysis.py
+
+import ast
+import asyncio
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional
+from loguru import logger
+from src.utils.metrics import STAGE_ERRORS, track
+
+# Механические правила из системного промта считаются локально по AST
+STATIC_ANALYSIS_ENABLED = os.getenv("STATIC_ANALYSIS_ENABLED", "1") == "1"
+STATIC_ANALYSIS_WORKERS = int(os.getenv("STATIC_ANALYSIS_WORKERS", str(os.cpu_count() or 1)))
+MAX_FUNCTION_LINES = int(os.getenv("STATIC_MAX_FUNCTION_LINES", "50"))
+MAX_NESTING = int(os.getenv("STATIC_MAX_NESTING", "4"))
+# Чистый файл не длиннее стольких строк не отправляется в ИИ; 0 — отправлять всегда
+STATIC_TRIVIAL_LINES = int(os.getenv("STATIC_TRIVIAL_LINES", "40"))
+# Меняется при правке правил — входит в ключ кэша ревью
+_RULES_VERSION = "2"
+
+CLEAN_REVIEW = ("✅ Статический анализ: нарушений правил структурного программирования нет, "
+                "файл небольшой — ревью ИИ не потребовалось.")
+
+_BLOCKS = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith, ast.Try) + (
+    (ast.Match,) if hasattr(ast, "Match") else ()) + ((ast.TryStar,) if hasattr(ast, "TryStar") else ())
+_FUNCTIONS = (ast.FunctionDef, ast.AsyncFunctionDef)
+_LOOPS = (ast.For, ast.AsyncFor, ast.While)
+# Свои области видимости: их return и break к внешней функции/циклу не относятся
+_SCOPES = _FUNCTIONS + (ast.ClassDef, ast.Lambda)
+
+
+@dataclass
+class Finding:
+    """Одно нарушение правила: где и что; first_line..last_line — функция или цикл, к которым оно относится."""
+    line: int
+    rule: str
+    message: str
+    first_line: int = 0
+    last_line: int = 0
+
+
+Analyzer = Callable[[str], List[Finding]]
+# Расширение файла → анализатор; анализатор бросает SyntaxError, если файл не разобрать
+ANALYZERS: Dict[str, Analyzer] = {}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def register_analyzer(*extensions: str) -> Callable[[Analyzer], Analyzer]:
+    """Декоратор: подключает анализатор для файлов с указанными расширениями."""
+    def decorator(func: Analyzer) -> Analyzer:
+        for ext in extensions:
+            ANALYZERS[ext] = func
+        return func
+    return decorator
+
+
+def fingerprint() -> str:
+    """Версия правил и лимитов — при их смене кэшированные ревью устаревают."""
+    raw = f"{STATIC_ANALYSIS_ENABLED}:{_RULES_VERSION}:{MAX_FUNCTION_LINES}:{MAX_NESTING}:{STATIC_TRIVIAL_LINES}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _own_nodes(node: ast.AST):
+    """Узлы тела функции/цикла без вложенных функций, классов и lambda."""
+    for child in ast.iter_child_nodes(node):
+        yield child
+        if not isinstance(child, _SCOPES):
+            yield from _own_nodes(child)
+
+
+def _own_statement_nodes(statements: List[ast.stmt]):
+    """Операторы и их узлы, как _own_nodes: вложенные def и class пропускаются целиком."""
+    for stmt in statements:
+        if not isinstance(stmt, _SCOPES):
+            yield stmt
+            yield from _own_nodes(stmt)
+
+
+def _max_nesting(statements: List[ast.stmt], depth: int = 0) -> tuple[int, int]:
+    """Наибольшая вложенность блоков → (глубина, строка самого глубокого блока)."""
+    best, line = depth, 0
+    for stmt in statements:
+        if isinstance(stmt, _FUNCTIONS + (ast.ClassDef,)):
+            continue
+        inner = depth + 1 if isinstance(stmt, _BLOCKS) else depth
+        nested = [getattr(stmt, "body", []), getattr(stmt, "finalbody", [])]
+        nested += [handler.body for handler in getattr(stmt, "handlers", [])]
+        nested += [case.body for case in getattr(stmt, "cases", [])]
+        orelse = getattr(stmt, "orelse", [])
+        # elif — продолжение того же ветвления, а не вложенный блок
+        is_elif = isinstance(stmt, ast.If) and len(orelse) == 1 and isinstance(orelse[0], ast.If)
+
+        candidates = [(inner, stmt.lineno)]
+        candidates += [_max_nesting(body, inner) for body in nested]
+        candidates.append(_max_nesting(orelse, depth if is_elif else inner))
+        for found, found_line in candidates:
+            if found > best:
+                best, line = found, found_line
+    return best, line
+
+
+def _is_guard(stmt: ast.stmt) -> bool:
+    """Предварительная проверка аргументов: if без else, который сразу выходит."""
+    return (isinstance(stmt, ast.If) and not stmt.orelse
+            and isinstance(stmt.body[-1], (ast.Return, ast.Raise)))
+
+
+def _check_function(func: ast.AST) -> List[Finding]:
+    findings: List[Finding] = []
+    name = func.name
+    scope = (func.lineno, func.end_lineno)
+    length = func.end_lineno - func.lineno + 1
+    if length > MAX_FUNCTION_LINES:
+        findings.append(Finding(func.lineno, "function-length",
+                                f"функция {name}: {length} строк (лимит {MAX_FUNCTION_LINES})", *scope))
+
+    depth, line = _max_nesting(func.body)
+    if depth > MAX_NESTING:
+        findings.append(Finding(line, "nesting", f"функция {name}: вложенность {depth} (лимит {MAX_NESTING})",
+                                *scope))
+
+    guards = 0
+    for stmt in func.body:
+        if not _is_guard(stmt):
+            break
+        guards += 1
+    returns = [node for node in _own_statement_nodes(func.body[guards:]) if isinstance(node, ast.Return)]
+    if len(returns) > 1:
+        findings.append(Finding(returns[1].lineno, "single-exit",
+                                f"функция {name}: {len(returns)} return (не считая проверок аргументов)", *scope))
+    return findings
+
+
+def _check_loop(loop: ast.AST) -> List[Finding]:
+    breaks = []
+    for stmt in loop.body:
+        for node in _own_statement_nodes([stmt]):
+            if isinstance(node, ast.Break) and not _inside_inner_loop(stmt, node):
+                breaks.append(node)
+    if len(breaks) > 1:
+        return [Finding(loop.lineno, "loop-exit", f"цикл: {len(breaks)} break (допускается один выход)",
+                        loop.lineno, loop.end_lineno)]
+    return []
+
+
+def _inside_inner_loop(stmt: ast.stmt, target: ast.Break) -> bool:
+    """break относится к вложенному циклу, а не к проверяемому."""
+    for node in _own_statement_nodes([stmt]):
+        if isinstance(node, _LOOPS) and any(child is target for child in _own_nodes(node)):
+            return True
+    return False
+
+
+@register_analyzer(".py", ".pyi")
+def analyze_python(source: str) -> List[Finding]:
+    """Длина функций, вложенность, единственный выход из функции и цикла, global."""
+    tree = ast.parse(source)
+    findings: List[Finding] = []
+    for node in ast.walk(tree):
+        if isinstance(node, _FUNCTIONS):
+            findings.extend(_check_function(node))
+        elif isinstance(node, _LOOPS):
+            findings.extend(_check_loop(node))
+        elif isinstance(node, ast.Global):
+            findings.append(Finding(node.lineno, "global", f"глобальные переменные: {', '.join(node.names)}"))
+    return sorted(findings, key=lambda finding: finding.line)
+
+
+def analyzer_for(path: str) -> Optional[Analyzer]:
+    return ANALYZERS.get(os.path.splitext(path)[1].lower())
+
+
+def _analyze(analyzer: Analyzer, source: str) -> Optional[List[dict]]:
+    """Выполняется в процессе пула: None — файл не разбирается.
+
+    Анализатор передаётся из родителя по имени модуля: в spawn-процессе реестр ANALYZERS
+    содержит только анализаторы, зарегистрированные при импорте этого модуля."""
+    try:
+        return [asdict(finding) for finding in analyzer(source)]
+    except (SyntaxError, ValueError, RecursionError):
+        return None
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: fork процесса с работающим event loop и потоками небезопасен
+        _pool = ProcessPoolExecutor(max_workers=STATIC_ANALYSIS_WORKERS,
+                                    mp_context=multiprocessing.get_context("spawn"))
+        logger.debug(f"🧮 Пул статического анализа: {STATIC_ANALYSIS_WORKERS} процессов")
+    return _pool
+
+
+async def analyze_files(contents: Dict[str, str]) -> Dict[str, List[dict]]:
+    """{path: исходник} → {path: [нарушения]} для поддержанных языков; разбор — в пуле процессов."""
+    analyzers = {path: analyzer_for(path) for path in contents}
+    paths = [path for path, analyzer in analyzers.items() if analyzer is not None]
+    if not STATIC_ANALYSIS_ENABLED or not paths:
+        return {}
+
+    loop = asyncio.get_running_loop()
+    with track("static_analysis"):
+        try:
+            results = await asyncio.gather(*(
+                loop.run_in_executor(_executor(), _analyze, analyzers[path], contents[path]) for path in paths
+            ))
+        except Exception as e:
+            STAGE_ERRORS.inc(stage="static_analysis")
+            logger.error(f"❌ Статический анализ не выполнен: {e}")
+            return {}
+
+    findings = {path: result for path, result in zip(paths, results) if result is not None}
+    logger.info(f"🧮 Статический анализ: {len(findings)} файлов, "
+                f"нарушений {sum(map(len, findings.values()))}")
+    return findings
+
+
+def is_trivial(source: str, findings: List[dict]) -> bool:
+    """Чистый и короткий файл — ревью ИИ ничего не добавит."""
+    return not findings and source.count("\n") + 1 <= STATIC_TRIVIAL_LINES
+
+
+def touching_lines(findings: List[dict], ranges: List[tuple[int, int]]) -> List[dict]:
+    """Нарушения, функция или цикл которых пересекается с одним из диапазонов строк (изменённые hunk'и)."""
+    return [item for item in findings
+            if any(start <= (item.get("last_line") or item["line"]) and (item.get("first_line") or item["line"]) <= end
+                   for start, end in ranges)]
+
+
+def format_findings(findings: Dict[str, List[dict]]) -> str:
+    """Нарушения для промта: точные данные, которые модели не нужно пересчитывать."""
+    lines = [f"- {path}:{item['line']} [{item['rule']}] {item['message']}"
+             for path in sorted(findings) for item in findings[path]]
+    clean = [path for path in sorted(findings) if not findings[path]]
+    if clean:
+        lines.append(f"- без нарушений: {', '.join(clean)}")
+    return "\n".join(lines)
+
+
+def shutdown() -> None:
+    """Останавливает пул процессов при остановке приложения."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
@@ -0,0 +1,117 @@
+# src/utils/webhook_dedup.py
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+from loguru import logger
+from src.utils import job_store
+from src.utils.review_queue import QueueFullError, ReviewQueue
+
+# Сколько помним X-GitHub-Delivery (секунды) и максимум хранимых ID
+WEBHOOK_DEDUP_TTL = int(os.getenv("WEBHOOK_DEDUP_TTL", "3600"))
+WEBHOOK_DEDUP_MAX = int(os.getenv("WEBHOOK_DEDUP_MAX", "10000"))
+# Окно склейки push'ей одного репозитория/ветки; 0 — без склейки
+PUSH_DEBOUNCE_SECONDS = float(os.getenv("PUSH_DEBOUNCE_SECONDS", "5"))
+# Дольше этого push не откладываем, даже если коммиты продолжают приходить
+PUSH_DEBOUNCE_MAX_WAIT = float(os.getenv("PUSH_DEBOUNCE_MAX_WAIT", "30"))
+
+
+class DeliveryDeduplicator:
+    """Ограниченное по размеру и времени множество уже принятых доставок GitHub."""
+
+    def __init__(self, ttl: int = WEBHOOK_DEDUP_TTL, max_size: int = WEBHOOK_DEDUP_MAX):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+
+    def _expire(self, now: float) -> None:
+        while self._seen:
+            seen_at = next(iter(self._seen.values()))
+            if now - seen_at < self._ttl and len(self._seen) <= self._max_size:
+                break
+            self._seen.popitem(last=False)
+
+    def is_duplicate(self, delivery_id: str) -> bool:
+        """Была ли доставка с таким ID уже принята в работу."""
+        self._expire(time.monotonic())
+        return delivery_id in self._seen
+
+    def remember(self, delivery_id: str) -> None:
+        """Отмечает доставку принятой (вызывать после успешной постановки в очередь)."""
+        self._seen[delivery_id] = time.monotonic()
+        self._seen.move_to_end(delivery_id)
+        self._expire(time.monotonic())
+
+
+def merge_pushes(older: Dict[str, Any], newer: Dict[str, Any]) -> Dict[str, Any]:
+    """Склеивает два push одной ветки: объединение файлов на самом новом after."""
+    removed = set(newer.get("removed_paths", []))
+    paths = (set(older["file_paths"]) - removed) | set(newer["file_paths"])
+    return {
+        **newer,
+        "before": older.get("before", newer.get("before", "")),
+        "file_paths": sorted(paths),
+        "removed_paths": sorted((set(older.get("removed_paths", [])) - paths) | removed),
+        "files": len(paths),
+        "pushes": older.get("pushes", 1) + newer.get("pushes", 1),
+    }
+
+
+class PushCoalescer:
+    """Откладывает ревью на окно debounce и склеивает push'и одного репозитория и ветки."""
+
+    def __init__(self, queue: ReviewQueue, window: float = PUSH_DEBOUNCE_SECONDS,
+                 max_wait: float = PUSH_DEBOUNCE_MAX_WAIT):
+        self._queue = queue
+        self._window = window
+        self._max_wait = max_wait
+        # (repo_id, ref) → {"job_id", "payload", "first_at", "handle"}
+        self._pending: Dict[Tuple[Any, str], Dict[str, Any]] = {}
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def is_pending(self, job_id: str) -> bool:
+        return any(entry["job_id"] == job_id for entry in self._pending.values())
+
+    def submit(self, payload: Dict[str, Any]) -> str:
+        """Принимает push; возвращает ID задачи, под которым он будет отревьюен."""
+        if self._window <= 0:
+            return self._queue.submit(payload).id
+
+        key = (payload["repo_id"], payload.get("ref", ""))
+        now = time.monotonic()
+        entry = self._pending.get(key)
+        if entry:
+            entry["handle"].cancel()
+            entry["payload"] = merge_pushes(entry["payload"], payload)
+            job_store.update_payload(entry["job_id"], {**entry["payload"], "job_id": entry["job_id"]})
+            logger.info(f"🧲 Push склеен с ожидающим ({entry['payload']['pushes']} шт.) для {key}")
+        else:
+            # Место в очереди резервируется сразу: принятый (202) push при flush уже не отклонить
+            if not self._queue.has_room(self.pending_count + 1):
+                raise QueueFullError("Очередь ревью переполнена")
+            entry = {"job_id": uuid.uuid4().hex, "payload": payload, "first_at": now}
+            self._pending[key] = entry
+            # Ожидающий push сохраняется сразу — после падения процесса его возобновит очередь
+            job_store.create_job(entry["job_id"], {**payload, "job_id": entry["job_id"]})
+
+        delay = max(0.0, min(self._window, entry["first_at"] + self._max_wait - now))
+        entry["handle"] = asyncio.get_running_loop().call_later(delay, self._flush, key)
+        return entry["job_id"]
+
+    def _flush(self, key: Tuple[Any, str]) -> None:
+        entry = self._pending.pop(key, None)
+        if entry is None:
+            return
+        self._queue.submit(entry["payload"], job_id=entry["job_id"], reserved=True)
+
+    def flush_all(self) -> None:
+        """Немедленно ставит в очередь все отложенные push'и (при остановке приложения)."""
+        for key in list(self._pending):
+            self._pending[key]["handle"].cancel()
+            self._flush(key)
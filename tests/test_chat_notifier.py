@@ -0,0 +1,87 @@
+import asyncio
+import re
+
+from src.utils import chat_notifier
+from src.utils.chat_notifier import TELEGRAM_MAX_LENGTH, LiveMessage, html_to_plain, markdown_to_html, split_html
+
+_TAG_RE = re.compile(r"<(/?)([a-z-]+)[^<>]*>")
+
+
+def _balanced(part: str) -> bool:
+    stack = []
+    for closing, name in _TAG_RE.findall(part):
+        if not closing:
+            stack.append(name)
+        elif not stack or stack.pop() != name:
+            return False
+    return not stack
+
+
+def test_generics_are_escaped_not_treated_as_tags():
+    converted = markdown_to_html("Use List<T> and Vec<u8>; a < b && c > d")
+    assert converted == "Use List&lt;T&gt; and Vec&lt;u8&gt;; a &lt; b &amp;&amp; c &gt; d"
+
+
+def test_markdown_subset_becomes_telegram_html():
+    converted = markdown_to_html("### Итог\n**Важно**: `x<y`\n```python\nif a < b:\n    pass\n```")
+    assert converted == ("<b>Итог</b>\n<b>Важно</b>: <code>x&lt;y</code>\n"
+                         "<pre>if a &lt; b:\n    pass</pre>")
+
+
+def test_long_review_with_generics_fits_telegram_limit():
+    line = "- `Map<String, List<T>>` в функции **parse** возвращает Vec<u8> <- без проверки"
+    text = markdown_to_html("\n".join(f"{n}. {line}" for n in range(300)))
+    parts = split_html(text)
+    assert len(parts) > 1
+    assert all(len(part) <= TELEGRAM_MAX_LENGTH for part in parts)
+    assert all(_balanced(part) for part in parts)
+    assert "".join(html_to_plain(part).strip("\n") for part in parts).count("Vec<u8>") == 300
+
+
+def test_code_block_is_reopened_in_every_part():
+    code = "\n".join(f"let v{n}: Vec<u8> = Vec::new();" for n in range(400))
+    parts = split_html(markdown_to_html(f"Пример:\n```rust\n{code}\n```\nКонец"))
+    assert all(len(part) <= TELEGRAM_MAX_LENGTH for part in parts)
+    assert all(_balanced(part) for part in parts)
+    assert all("<pre>" in part for part in parts[1:-1])
+
+
+def test_line_without_newlines_is_hard_split():
+    parts = split_html("<b>" + "x" * 10000 + "</b>", limit=1000)
+    assert all(len(part) <= 1000 and _balanced(part) for part in parts)
+    assert sum(part.count("x") for part in parts) == 10000
+
+
+def test_short_text_is_one_part():
+    assert split_html("<b>ok</b>") == ["<b>ok</b>"]
+
+
+def _fake_post(calls: list, responses: dict):
+    async def post(url: str, method: str, payload: dict):
+        calls.append((method, payload))
+        return responses.get(method, {"ok": True, "result": {"message_id": 100 + len(calls)}})
+    return post
+
+
+def test_resumed_delivery_skips_sent_parts(monkeypatch):
+    calls, progress = [], []
+    monkeypatch.setattr(chat_notifier, "_post", _fake_post(calls, {}))
+    report = "\n".join(f"строка {n} " + "x" * 90 for n in range(100))
+    parts = split_html(report)
+    assert len(parts) == 3
+
+    live = LiveMessage("1", message_id=7, header="")
+    assert asyncio.run(live.finish(report, sent=1, on_sent=progress.append))
+    assert [(method, payload["text"]) for method, payload in calls] == [("sendMessage", part) for part in parts[1:]]
+    assert progress == [2, 3]
+
+
+def test_unchanged_edit_counts_as_delivered(monkeypatch):
+    calls = []
+    not_modified = {"ok": False, "error_code": 400,
+                    "description": "Bad Request: message is not modified: specified new message content "
+                                   "and reply markup are exactly the same"}
+    monkeypatch.setattr(chat_notifier, "_post", _fake_post(calls, {"editMessageText": not_modified}))
+
+    assert asyncio.run(LiveMessage("1", message_id=7).finish("<b>готово</b>"))
+    assert [(method, payload.get("parse_mode")) for method, payload in calls] == [("editMessageText", "HTML")]
@@ -0,0 +1,161 @@
+import asyncio
+import textwrap
+
+from src.utils.static_analysis import (ANALYZERS, MAX_FUNCTION_LINES, MAX_NESTING, Finding, analyze_files,
+                                       analyze_python, analyzer_for, format_findings, is_trivial, shutdown,
+                                       touching_lines)
+
+
+def _rules(source: str) -> list:
+    return [(finding.rule, finding.line) for finding in analyze_python(textwrap.dedent(source))]
+
+
+def test_returns_of_nested_functions_are_not_counted():
+    source = """
+    def outer(x):
+        def inner(y):
+            if y:
+                return 1
+            return 2
+        return inner(x)
+    """
+    assert _rules(source) == []
+
+    source = """
+    def outer(x):
+        def inner(y):
+            if y:
+                return 1
+            else:
+                return 2
+        return inner(x)
+    """
+    findings = analyze_python(textwrap.dedent(source))
+    assert [(finding.rule, finding.line) for finding in findings] == [("single-exit", 7)]
+    assert "inner" in findings[0].message
+
+
+def test_several_returns_are_reported():
+    source = """
+    def pick(x):
+        if x > 0:
+            return 1
+        else:
+            return -1
+    """
+    assert _rules(source) == [("single-exit", 6)]
+
+
+def test_guard_clauses_are_allowed():
+    source = """
+    def area(width, height):
+        if width < 0:
+            raise ValueError(width)
+        if height < 0:
+            return 0
+        return width * height
+    """
+    assert _rules(source) == []
+
+
+def test_lambda_and_class_returns_are_not_counted():
+    source = """
+    def build():
+        key = lambda item: item[0]
+
+        class Box:
+            def get(self):
+                return 1
+
+        return key, Box
+    """
+    assert _rules(source) == []
+
+
+def test_loop_with_two_breaks():
+    source = """
+    for item in items:
+        if item is None:
+            break
+        if item < 0:
+            break
+    """
+    assert _rules(source) == [("loop-exit", 2)]
+
+
+def test_breaks_of_inner_loops_and_functions_are_not_counted():
+    source = """
+    for row in rows:
+        for cell in row:
+            if cell:
+                break
+        def scan(values):
+            for value in values:
+                break
+        if row is None:
+            break
+    """
+    assert _rules(source) == []
+
+
+def test_nesting_and_elif_chain():
+    deep = "def f(x):\n" + "".join("    " * (n + 1) + f"if x > {n}:\n" for n in range(MAX_NESTING + 1))
+    deep += "    " * (MAX_NESTING + 2) + "pass\n"
+    assert ("nesting", MAX_NESTING + 2) in _rules(deep)
+
+    chain = "def g(x):\n    if x == 0:\n        y = 0\n"
+    chain += "".join(f"    elif x == {n}:\n        y = {n}\n" for n in range(1, MAX_NESTING + 3))
+    chain += "    return y\n"
+    assert _rules(chain) == []
+
+
+def test_long_function_and_global():
+    body = "".join(f"    x{n} = {n}\n" for n in range(MAX_FUNCTION_LINES))
+    source = "def long():\n    global counter\n" + body
+    assert _rules(source) == [("function-length", 1), ("global", 2)]
+
+
+def test_helpers():
+    assert analyzer_for("pkg/mod.py") is analyze_python
+    assert analyzer_for("README.md") is None
+    assert is_trivial("x = 1\n", [])
+    assert not is_trivial("x = 1\n", [{"line": 1, "rule": "global", "message": "m"}])
+    findings = {"b.py": [], "a.py": [{"line": 3, "rule": "single-exit", "message": "функция f: 2 return"}]}
+    assert format_findings(findings) == "- a.py:3 [single-exit] функция f: 2 return\n- без нарушений: b.py"
+
+
+def test_findings_outside_changed_lines_are_dropped():
+    source = """
+    def first(x):
+        if x:
+            return 1
+        else:
+            return 2
+
+
+    def second(x):
+        if x:
+            return 1
+        else:
+            return 2
+    """
+    findings = [finding.__dict__ for finding in analyze_python(textwrap.dedent(source))]
+    assert [item["first_line"] for item in findings] == [2, 9]
+    assert [item["line"] for item in touching_lines(findings, [(10, 10)])] == [13]
+    assert touching_lines(findings, [(7, 8)]) == []
+    assert touching_lines([{"line": 4, "rule": "global", "message": "m"}], [(1, 4)])
+
+
+def _analyze_plugin(source: str) -> list:
+    return [Finding(1, "plugin", f"{len(source)} символов")]
+
+
+def test_analyzers_registered_outside_the_module_run_in_the_pool():
+    ANALYZERS[".plugin"] = _analyze_plugin
+    try:
+        findings = asyncio.run(analyze_files({"a.plugin": "abc", "b.py": "x = 1\n", "c.txt": "?"}))
+    finally:
+        del ANALYZERS[".plugin"]
+        shutdown()
+    plugin = {"line": 1, "rule": "plugin", "message": "3 символов", "first_line": 0, "last_line": 0}
+    assert findings == {"a.plugin": [plugin], "b.py": []}